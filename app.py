@@ -1,11 +1,21 @@
 import streamlit as st
 import pandas as pd
-import requests
 import folium
 from streamlit_folium import st_folium
 import altair as alt
+import logging
+import time
 from datetime import datetime
 
+import requests
+
+from trees.api import ApiClient
+from trees.api_cache import CHECKPOINT_PATH, FrameCache, ResponseCache
+from trees.sources import ApiSource, ExportSource, LocalSource, PartialLoad
+from trees.summary import summarize
+
+logger = logging.getLogger(__name__)
+
 # --- Dashboard Configuration ---
 st.set_page_config(page_title="Tree Dashboard", layout="wide")
 PRIMARY_COLOR = "#A7C7E7"
@@ -25,72 +35,49 @@ st.markdown(f"""
 """, unsafe_allow_html=True)
 
 
-# --- Load CSV Data ---
-@st.cache_data
-def load_csv_data(neighbourhood):
-    df = pd.read_csv("data/public-trees.csv", sep=";")
-    df = df[df["NEIGHBOURHOOD_NAME"].str.upper() == neighbourhood.upper()]
-    return df
-
-# --- Fetch API Data ---
-@st.cache_data(ttl=3600)
-def fetch_api_data(neighbourhood):
-    base_url = "https://opendata.vancouver.ca"
-    api_path = "/api/explore/v2.1/catalog/datasets/public-trees/records"
-    all_results = []
-    offset, limit, MAX = 0, 100, 10000
-    while offset < MAX:
-        url = f"{base_url}{api_path}?limit={limit}&offset={offset}&where=neighbourhood_name='{neighbourhood}'"
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            results = data.get('results', [])
-            all_results.extend(results)
-            if len(results) < limit:
-                break
-            offset += limit
-        except Exception as e:
-            st.error(f"API Error: {e}")
-            break
-    return pd.json_normalize(all_results)
-
-# --- Parse Data ---
-def parse_data(df):
-    # Normalize column names to uppercase
-    df.columns = [col.upper() for col in df.columns]
-
-    # Location parsing
-    if 'GEO_POINT_2D' in df.columns:
-        coords = df['GEO_POINT_2D'].str.split(',', expand=True)
-        df['LATITUDE'] = pd.to_numeric(coords[0], errors='coerce')
-        df['LONGITUDE'] = pd.to_numeric(coords[1], errors='coerce')
-    elif 'GEOM.GEOMETRY.COORDINATES' in df.columns:
-        df['LATITUDE'] = df['GEOM.GEOMETRY.COORDINATES'].apply(lambda x: x[1] if isinstance(x, list) and len(x) == 2 else None)
-        df['LONGITUDE'] = df['GEOM.GEOMETRY.COORDINATES'].apply(lambda x: x[0] if isinstance(x, list) and len(x) == 2 else None)
-    else:
-        df['LATITUDE'] = None
-        df['LONGITUDE'] = None
-
-    # Standardize and fill missing fields
-    df['COMMON_NAME'] = df['COMMON_NAME'].fillna('Unknown') if 'COMMON_NAME' in df else 'Unknown'
-    df['SPECIES_NAME'] = df['SPECIES_NAME'].fillna('Unknown') if 'SPECIES_NAME' in df else 'Unknown'
-    df['HEIGHT_RANGE'] = df['HEIGHT_RANGE'].fillna('Unknown') if 'HEIGHT_RANGE' in df else 'Unknown'
-    df['DIAMETER'] = pd.to_numeric(df['DIAMETER'], errors='coerce') if 'DIAMETER' in df else None
-    df['DATE_PLANTED'] = pd.to_datetime(df['DATE_PLANTED'], errors='coerce') if 'DATE_PLANTED' in df else None
-    df['PLANT_YEAR'] = df['DATE_PLANTED'].apply(lambda x: x.year if pd.notnull(x) else None)
-
-    # Assign lowercase columns for UI
-    df['common_name'] = df['COMMON_NAME']
-    df['species_name'] = df['SPECIES_NAME']
-    df['height_range'] = df['HEIGHT_RANGE']
-    df['diameter'] = df['DIAMETER']
-    df['plant_date'] = df['DATE_PLANTED']
-    df['plant_year'] = df['PLANT_YEAR']
-    df['latitude'] = df['LATITUDE']
-    df['longitude'] = df['LONGITUDE']
-
-    return df.dropna(subset=['latitude', 'longitude'])
+# --- Data Sources ---
+# Every source loads a neighbourhood straight into the canonical columns (trees.parse.COLUMNS)
+@st.cache_resource
+def data_sources():
+    # Built once per process, so every API load shares one connection pool across reruns.
+    # Downloads are kept on disk and reused until the City's dataset changes (trees.api_cache), and an
+    # interrupted API download resumes from the pages it saved.
+    client = ApiClient(cache=ResponseCache())
+    frames = FrameCache()
+    return {
+        "CSV": LocalSource(),
+        "API": ApiSource(client=client, frames=frames, checkpoint_path=CHECKPOINT_PATH),
+        "Export": ExportSource("csv", client=client, frames=frames),
+    }
+
+SOURCES = data_sources()
+DATA_SOURCES = {
+    "CSV (faster, local file)": "CSV",
+    "API (live city data)": "API",
+    "API export (live city data, one download)": "Export",
+}
+
+@st.cache_resource(max_entries=64)
+def load_trees(source, neighbourhood, version):
+    # Shared by every session and rerun for this data version, so filter changes never re-parse.
+    # Callers must treat the frame as read-only.
+    return SOURCES[source].load(neighbourhood)
+
+def load_or_report(source, neighbourhood, version):
+    # A download that failed part way raises instead of being cached: show what did arrive, and the next
+    # run downloads again
+    try:
+        return load_trees(source, neighbourhood, version)
+    except PartialLoad as e:
+        st.error(str(e))
+        return e.frame
+
+@st.cache_data(max_entries=64)
+def load_summary(source, neighbourhood, version):
+    # Filter options and unfiltered statistics, without loading the trees: precomputed by
+    # `python -m trees build` for CSV mode, aggregated by the API for the API modes (except while an
+    # older copy of the trees is served, when they're summarized from that copy to match the map)
+    return SOURCES[source].summary(neighbourhood)
 
 # --- Create Map ---
 def create_map(df, highlight=None):
@@ -107,9 +94,55 @@ def create_map(df, highlight=None):
             ).add_to(m)
     return m
 
+# --- Data Age ---
+def format_age(seconds):
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "less than a minute"
+    if minutes < 120:
+        return f"{minutes} minute{'s' if minutes != 1 else ''}"
+    hours = minutes // 60
+    return f"{hours} hours" if hours < 48 else f"{hours // 24} days"
+
+def show_data_age(placeholder, df, refreshing):
+    # API downloads say when they were made; a stale copy is served while a newer one downloads. Whether
+    # one is downloading is asked on every run: the frame itself stays cached until the version changes
+    fetched_at = df.attrs.get("fetched_at")
+    if fetched_at is None:
+        return
+    note = f"Data downloaded {format_age(time.time() - fetched_at)} ago"
+    if refreshing:
+        note += "; newer City data is downloading and will show once it's ready"
+    placeholder.caption(note)
+
+# --- Statistics ---
+def show_statistics(stats):
+    st.markdown("### 📊 Statistics")
+    avg_diameter = stats['avg_diameter']
+    oldest, newest = stats['year_range']
+
+    k1, k2, k3 = st.columns(3)
+    k1.metric("Average Diameter", f"{avg_diameter:.1f} in" if avg_diameter is not None else "Unknown")
+    k2.metric("Oldest Year", f"{int(oldest) if pd.notnull(oldest) else 'Unknown'}")
+    k3.metric("Newest Year", f"{int(newest) if pd.notnull(newest) else 'Unknown'}")
+
+    st.markdown("### Tree Distributions")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("**Top Tree Types**")
+        chart_data = pd.DataFrame(stats['top_types'], columns=['Tree Type', 'Count'])
+        st.altair_chart(alt.Chart(chart_data).mark_bar(color=PRIMARY_COLOR).encode(
+            x='Count:Q', y=alt.Y('Tree Type:N', sort='-x')), use_container_width=True)
+
+    with col2:
+        st.markdown("**Height Range Distribution**")
+        height_data = pd.DataFrame(stats['height_distribution'], columns=['Height Range', 'Count'])
+        st.altair_chart(alt.Chart(height_data).mark_bar(color=PRIMARY_COLOR).encode(
+            x='Count:Q', y=alt.Y('Height Range:N', sort='-x')), use_container_width=True)
+
 # --- UI Layout ---
 st.title("🌳 Vancouver Trees Dashboard")
-data_source = st.selectbox("Select Data Source", ["", "CSV (faster, local file)", "API (live city data)"])
+data_source = st.selectbox("Select Data Source", ["", *DATA_SOURCES])
 neighbourhoods = ["", "ARBUTUS RIDGE", "DOWNTOWN", "DUNBAR-SOUTHLANDS", "FAIRVIEW",
     "GRANDVIEW-WOODLAND", "HASTINGS-SUNRISE", "KENSINGTON-CEDAR COTTAGE", "KERRISDALE",
     "KILLARNEY", "KITSILANO", "MARPOLE", "MOUNT PLEASANT", "OAKRIDGE", "RENFREW-COLLINGWOOD",
@@ -118,25 +151,28 @@ neighbourhoods = ["", "ARBUTUS RIDGE", "DOWNTOWN", "DUNBAR-SOUTHLANDS", "FAIRVIE
 selected = st.selectbox("Select Neighbourhood", neighbourhoods)
 
 if data_source and selected:
-    with st.spinner("Loading data..."):
-        if "CSV" in data_source:
-            df = load_csv_data(selected)
-        elif "API" in data_source:
-            df = fetch_api_data(selected)
-
-        df = parse_data(df)
+    source = DATA_SOURCES[data_source]
+    version = SOURCES[source].version()
+    df = None
+    try:
+        summary = load_summary(source, selected, version)
+    except requests.RequestException:
+        # The API couldn't aggregate: summarize the loaded trees instead. Not cached, so the next run asks again
+        logger.warning("Summarizing %s through the API failed", selected, exc_info=True)
+        summary = None
+    if summary is None:
+        with st.spinner("Loading data..."):
+            df = load_or_report(source, selected, version)
+        summary = summarize(df)
 
-    df_clean = df.copy()
     st.sidebar.header("🔍 Filters")
     clear = st.sidebar.button("Clear All Filters")
 
     # Setup filters
-    common_names = sorted(df_clean['common_name'].unique())
-    height_ranges = sorted(df_clean['height_range'].unique())
-    min_diam_val = df_clean['diameter'].min(skipna=True)
-    max_diam_val = df_clean['diameter'].max(skipna=True)
-    min_year_val = df_clean['plant_year'].min(skipna=True)
-    max_year_val = df_clean['plant_year'].max(skipna=True)
+    common_names = summary['common_names']
+    height_ranges = summary['height_ranges']
+    min_diam_val, max_diam_val = summary['diameter_range']
+    min_year_val, max_year_val = summary['year_range']
 
     min_diam = int(min_diam_val) if pd.notnull(min_diam_val) else 0
     max_diam = int(max_diam_val) if pd.notnull(max_diam_val) else 100
@@ -148,8 +184,22 @@ if data_source and selected:
     min_diameter = st.sidebar.slider("Minimum Diameter", min_diam, max_diam, min_diam) if not clear else min_diam
     selected_year = st.sidebar.slider("Planted After Year", min_year, max_year, min_year) if not clear else min_year
 
+    filtered = selected_names or selected_heights or min_diameter > min_diam or selected_year > min_year
+
+    # Lay out the trees' sections first, then fill in the unfiltered statistics, which don't need the
+    # trees, before they're loaded
+    heading = st.empty()
+    data_age = st.empty()
+    trees_area = st.container()
+    if not filtered and summary['rows']:
+        show_statistics(summary)
+
+    if df is None:
+        with st.spinner("Loading data..."):
+            df = load_or_report(source, selected, version)
+
     # Apply filters
-    if selected_names or selected_heights or min_diameter > min_diam or selected_year > min_year:
+    if filtered:
         df_filtered = df[df['diameter'].notnull() & df['plant_year'].notnull()].copy()
         if selected_names:
             df_filtered = df_filtered[df_filtered['common_name'].isin(selected_names)]
@@ -160,37 +210,16 @@ if data_source and selected:
     else:
         df_filtered = df
 
-    st.subheader(f"🌲 Showing {len(df_filtered)} Trees in {selected}")
-    if df_filtered.empty:
-        st.info("No trees match the selected filters.")
-    else:
-        st_folium(create_map(df_filtered), width=700, height=500, key="filtered-map")
-
-        st.markdown("### 📊 Statistics")
-        avg_diameter = df_filtered['diameter'].mean()
-        oldest = df_filtered['plant_year'].min()
-        newest = df_filtered['plant_year'].max()
-
-        k1, k2, k3 = st.columns(3)
-        k1.metric("Average Diameter", f"{avg_diameter:.1f} in")
-        k2.metric("Oldest Year", f"{int(oldest) if pd.notnull(oldest) else 'Unknown'}")
-        k3.metric("Newest Year", f"{int(newest) if pd.notnull(newest) else 'Unknown'}")
-
-        st.markdown("### Tree Distributions")
-        col1, col2 = st.columns(2)
-        with col1:
-            st.markdown("**Top Tree Types**")
-            chart_data = df_filtered['common_name'].value_counts().nlargest(10).reset_index()
-            chart_data.columns = ['Tree Type', 'Count']
-            st.altair_chart(alt.Chart(chart_data).mark_bar(color=PRIMARY_COLOR).encode(
-                x='Count:Q', y=alt.Y('Tree Type:N', sort='-x')), use_container_width=True)
-
-        with col2:
-            st.markdown("**Height Range Distribution**")
-            height_data = df_filtered['height_range'].value_counts().reset_index()
-            height_data.columns = ['Height Range', 'Count']
-            st.altair_chart(alt.Chart(height_data).mark_bar(color=PRIMARY_COLOR).encode(
-                x='Count:Q', y=alt.Y('Height Range:N', sort='-x')), use_container_width=True)
+    heading.subheader(f"🌲 Showing {len(df_filtered)} Trees in {selected}")
+    show_data_age(data_age, df, SOURCES[source].refreshing(selected))
+    with trees_area:
+        if df_filtered.empty:
+            st.info("No trees match the selected filters.")
+        else:
+            st_folium(create_map(df_filtered), width=700, height=500, key="filtered-map")
+    if not df_filtered.empty:
+        if filtered:
+            show_statistics(summarize(df_filtered))
 
         st.markdown("### 📚 Tree Spotlight")
         spotlight = st.selectbox("Highlight a Tree", [""] + df_filtered['common_name'].unique().tolist())
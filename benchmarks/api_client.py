@@ -0,0 +1,64 @@
+"""Fetch a neighbourhood page by page against the local stand-in API: a bare
+requests.get per page (new connection, uncompressed) vs one pooled ApiClient
+(keep-alive, gzip).
+
+    python -m benchmarks.api_client [--latency 0.05]
+"""
+import argparse
+import time
+
+import requests
+
+from trees.api import PAGE_SIZE, RECORDS_PATH, ApiClient, neighbourhood_filter
+from trees.local_api import start_server
+
+NEIGHBOURHOODS = ["STRATHCONA", "KITSILANO", "HASTINGS-SUNRISE"]
+
+
+def offsets(get, neighbourhood):
+    first = get(0)
+    return first, range(PAGE_SIZE, min(first.json()["total_count"], 10000), PAGE_SIZE)
+
+
+def fetch(get, neighbourhood):
+    """Sequential pages; returns (seconds, records, bytes on the wire)."""
+    start = time.perf_counter()
+    first, rest = offsets(get, neighbourhood)
+    responses = [first] + [get(offset) for offset in rest]
+    elapsed = time.perf_counter() - start
+    records = sum(len(response.json()["results"]) for response in responses)
+    wire = sum(int(response.headers["Content-Length"]) for response in responses)
+    return elapsed, records, wire
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    server, base_url = start_server(latency=args.latency)
+    client = ApiClient(base_url)
+    print(f"{'neighbourhood':<20}{'records':>8}{'bare s':>9}{'bare MB':>9}{'client s':>10}{'client MB':>11}")
+    try:
+        for name in NEIGHBOURHOODS:
+            params = {"limit": PAGE_SIZE, "where": neighbourhood_filter(name)}
+
+            def bare(offset):
+                return requests.get(f"{base_url}{RECORDS_PATH}", params={**params, "offset": offset},
+                                    headers={"Accept-Encoding": "identity"})
+
+            def pooled(offset):
+                return client.get(RECORDS_PATH, {**params, "offset": offset})
+
+            bare_s, records, bare_bytes = fetch(bare, name)
+            pooled_s, pooled_records, pooled_bytes = fetch(pooled, name)
+            assert records == pooled_records
+            print(f"{name:<20}{records:>8}{bare_s:>9.2f}{bare_bytes / 1e6:>9.2f}"
+                  f"{pooled_s:>10.2f}{pooled_bytes / 1e6:>11.2f}")
+        print("client latency:", {key: round(value, 1) for key, value in client.metrics().items()})
+    finally:
+        client.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Time the API-path coordinate extraction: json_normalize + two row-wise applies vs trees.parse.record_point.
+
+Builds a GeoJSON geom for every tree in data/public-trees.csv (~180k records),
+1% of them malformed, the way the API serves them. The applies ran over the
+GEOM.GEOMETRY.COORDINATES column pd.json_normalize made of the records;
+RecordColumns.add now calls record_point on each record of a page as it
+arrives, with no flattened frame in between.
+
+    python -m benchmarks.api_coordinates
+"""
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from trees.dataset import CSV_PATH
+from trees.parse import record_point
+
+
+def apply_coordinates(records):
+    series = pd.json_normalize(records)["geom.geometry.coordinates"]
+    latitude = series.apply(lambda x: x[1] if isinstance(x, list) and len(x) == 2 else None)
+    longitude = series.apply(lambda x: x[0] if isinstance(x, list) and len(x) == 2 else None)
+    return latitude, longitude
+
+
+def record_coordinates(records):
+    points = list(map(record_point, records))
+    return (pd.Series([point[0] for point in points], dtype=float),
+            pd.Series([point[1] for point in points], dtype=float))
+
+
+def best_of(func, data, runs=5):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func(data)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    geom = pd.read_csv(CSV_PATH, sep=";", usecols=["Geom"])["Geom"]
+    coords = [json.loads(g)["coordinates"] for g in geom]
+    rng = np.random.default_rng(0)
+    for n, i in enumerate(rng.choice(len(coords), len(coords) // 100, replace=False)):
+        coords[i] = [None, [], [coords[i][0]], "POINT"][n % 4]
+    records = [{"geom": {"type": "Feature", "geometry": {"type": "Point", "coordinates": c}}} for c in coords]
+
+    before, (lat_a, lon_a) = best_of(apply_coordinates, records)
+    after, (lat_b, lon_b) = best_of(record_coordinates, records)
+    assert lat_a.astype(float).equals(lat_b) and lon_a.astype(float).equals(lon_b)
+    print(f"{len(records)} records: json_normalize + apply x2 {before * 1e3:.1f} ms, "
+          f"record_point {after * 1e3:.1f} ms ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Time paged /records fetches against one streamed export, on the local stand-in API.
+
+Every response is delayed by --latency seconds to stand in for the round trip
+to opendata.vancouver.ca. The records endpoint stops at 10,000 records, so the
+citywide row is export-only.
+
+    python -m benchmarks.api_export [--latency 0.05]
+"""
+import argparse
+import time
+
+from trees.api import ApiClient
+from trees.local_api import start_server
+from trees.sources import ApiSource, ExportSource
+
+NEIGHBOURHOODS = ["STRATHCONA", "KITSILANO", None]
+
+
+def timed(source, neighbourhood):
+    start = time.perf_counter()
+    df = source.load(neighbourhood)
+    return time.perf_counter() - start, len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    server, base_url = start_server(latency=args.latency)
+    client = ApiClient(base_url)
+    sources = {
+        "records": ApiSource(print, client),
+        "export csv": ExportSource("csv", print, client),
+        "export jsonl": ExportSource("jsonl", print, client),
+    }
+    print(f"{'neighbourhood':<14}" + "".join(f"{name + ' s':>16}" for name in sources) + f"{'trees':>9}")
+    try:
+        for name in NEIGHBOURHOODS:
+            results = [timed(source, name) if name or label != "records" else (float("nan"), 0)
+                       for label, source in sources.items()]
+            print(f"{name or 'CITYWIDE':<14}" + "".join(f"{seconds:>16.2f}" for seconds, _ in results)
+                  + f"{results[1][1]:>9}")
+    finally:
+        client.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
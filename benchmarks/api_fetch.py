@@ -0,0 +1,40 @@
+"""Time fetch_api_data against the local stand-in API, sequential vs concurrent pages.
+
+Every response is delayed by --latency seconds to stand in for the round trip
+to opendata.vancouver.ca.
+
+    python -m benchmarks.api_fetch [--latency 0.05]
+"""
+import argparse
+import time
+
+from trees.api import MAX_WORKERS, ApiClient, fetch_api_data
+from trees.local_api import start_server
+
+NEIGHBOURHOODS = ["STRATHCONA", "KITSILANO", "HASTINGS-SUNRISE"]
+
+
+def timed(neighbourhood, base_url, max_workers):
+    start = time.perf_counter()
+    df = fetch_api_data(neighbourhood, on_error=print, client=ApiClient(base_url), max_workers=max_workers)
+    return time.perf_counter() - start, len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    server, base_url = start_server(latency=args.latency)
+    print(f"{'neighbourhood':<20}{'records':>8}{'sequential s':>14}{f'{MAX_WORKERS} workers s':>14}{'speedup':>9}")
+    try:
+        for name in NEIGHBOURHOODS:
+            sequential, rows = timed(name, base_url, 1)
+            concurrent, concurrent_rows = timed(name, base_url, MAX_WORKERS)
+            assert rows == concurrent_rows
+            print(f"{name:<20}{rows:>8}{sequential:>14.2f}{concurrent:>14.2f}{sequential / concurrent:>8.1f}x")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
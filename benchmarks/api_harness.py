@@ -0,0 +1,78 @@
+"""Run the API client end to end against the local stand-in API and report throughput.
+
+Each mode loads every neighbourhood through the same code the dashboard uses
+(trees.sources), with a fresh ApiClient and no disk caches:
+
+- records: ApiSource, paged /records requests
+- export:  ExportSource, one streamed CSV export
+- summary: ApiSource.summary, aggregate requests only
+
+The stand-in adds --latency (plus up to --jitter) seconds to every response and
+fails an --error-rate fraction of requests, so the client's behaviour under a
+slow or flaky server can be measured too; --retries sets how often the client
+retries a failed request.
+
+    python -m benchmarks.api_harness [--latency 0.05] [--error-rate 0.01] [--modes records export]
+"""
+import argparse
+import time
+
+from trees.api import RETRIES, ApiClient
+from trees.local_api import start_server
+from trees.sources import ApiSource, ExportSource, PartialLoad
+
+MODES = {
+    "records": lambda client, errors: ApiSource(errors.append, client).load,
+    "export": lambda client, errors: ExportSource("csv", errors.append, client).load,
+    "summary": lambda client, errors: ApiSource(errors.append, client).summary,
+}
+NEIGHBOURHOODS = ["STRATHCONA", "KITSILANO", "RENFREW-COLLINGWOOD"]
+
+
+def run(mode, neighbourhood, base_url, retries):
+    client = ApiClient(base_url, retries=retries)
+    errors = []
+    load = MODES[mode](client, errors)
+    start = time.perf_counter()
+    try:
+        result = load(neighbourhood)
+    except PartialLoad as e:
+        result = e.frame
+    except Exception as e:  # summary raises once the client has given up on a request
+        result = None
+        errors.append(str(e))
+    elapsed = time.perf_counter() - start
+    if result is None:
+        trees = 0
+    else:
+        trees = result["rows"] if isinstance(result, dict) else len(result)
+    return elapsed, trees, client.metrics(), errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--retries", type=int, default=RETRIES)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--neighbourhoods", nargs="+", default=NEIGHBOURHOODS)
+    args = parser.parse_args()
+    server, base_url = start_server(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                    seed=args.seed)
+    print(f"{'mode':<9}{'neighbourhood':<22}{'trees':>7}{'s':>7}{'trees/s':>9}{'requests':>10}{'retries':>9}"
+          f"{'p50 ms':>8}{'p95 ms':>8}  errors")
+    try:
+        for mode in args.modes:
+            for name in args.neighbourhoods:
+                elapsed, trees, metrics, errors = run(mode, name, base_url, args.retries)
+                print(f"{mode:<9}{name:<22}{trees:>7}{elapsed:>7.2f}{trees / elapsed:>9.0f}"
+                      f"{metrics['requests']:>10}{metrics['retries']:>9}"
+                      f"{metrics.get('p50_ms', 0):>8.0f}{metrics.get('p95_ms', 0):>8.0f}  {'; '.join(errors)[:60]}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
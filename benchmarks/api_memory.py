@@ -0,0 +1,61 @@
+"""Peak memory of a citywide API fetch: records kept as dicts and flattened vs decoded into typed buffers.
+
+The local stand-in API runs in this process; each variant fetches every record
+from it in a fresh interpreter, so the resident-memory numbers don't leak into
+each other. Both keyset-paged variants fetch the same pages one after another;
+``fetch_api_data`` is the concurrent fetch API mode uses. Run from the
+repository root:
+
+    python -m benchmarks.api_memory
+"""
+import subprocess
+import sys
+
+from trees.local_api import start_server
+
+VARIANTS = {
+    "dicts + json_normalize": "records = []\n"
+                              "fetch_key_range(client, None, 0, None, SELECT_FIELDS, records.extend)\n"
+                              "df = from_api(pd.json_normalize(records))",
+    "typed buffers": "columns = RecordColumns()\n"
+                     "fetch_key_range(client, None, 0, None, SELECT_FIELDS, columns.add)\n"
+                     "df = columns.frame()",
+    "fetch_api_data": "df = fetch_api_data(None, print, client)",
+}
+
+# Importing pandas peaks above what a fetch adds, so the peak is reset (Linux only) before measuring
+SCRIPT = """
+import time
+import pandas as pd
+from trees.api import SELECT_FIELDS, ApiClient, fetch_api_data, fetch_key_range
+from trees.parse import RecordColumns
+from benchmarks.api_records import from_api
+def status(key):
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(key))
+client = ApiClient({base_url!r})
+with open("/proc/self/clear_refs", "w") as f:
+    f.write("5")
+base = status("VmRSS:")
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+peak = status("VmHWM:") - base
+print(f"{{len(df)}} {{elapsed:.2f}} {{df.memory_usage(deep=True).sum() / 1e6:.1f}} {{peak / 1e3:.1f}}")
+"""
+
+
+def main():
+    server, base_url = start_server()
+    print(f"{'variant':<24}{'records':>9}{'fetch s':>9}{'frame MB':>10}{'peak RSS MB':>13}")
+    try:
+        for name, code in VARIANTS.items():
+            result = subprocess.run([sys.executable, "-c", SCRIPT.format(base_url=base_url, code=code)],
+                                    capture_output=True, text=True, check=True).stdout.split()
+            print(f"{name:<24}{result[0]:>9}{result[1]:>9}{result[2]:>10}{result[3]:>13}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
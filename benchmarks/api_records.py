@@ -0,0 +1,75 @@
+"""Time turning API records into the canonical frame: pd.json_normalize + from_api vs trees.parse.RecordColumns.
+
+Records are built the way the API serves them (trees.local_api.to_records), with
+every field (the nested GeoJSON geom included) and with SELECT_FIELDS, and fed
+to RecordColumns a page at a time as fetch_api_data does. Both conversions must
+give the same frame.
+
+    python -m benchmarks.api_records
+"""
+import time
+
+import pandas as pd
+
+from trees.api import PAGE_SIZE, SELECT_FIELDS
+from trees.local_api import load_records, to_records
+from trees.parse import RecordColumns, canonical_frame, empty_frame
+from trees.schema import parse_date_planted
+
+SIZES = [10_000, 100_000]
+
+
+def from_api(df):
+    """The converter RecordColumns replaced: pd.json_normalize'd API records into COLUMNS."""
+    if df.empty:
+        return empty_frame()
+
+    def field(name):
+        return df[name] if name in df else None
+
+    latitude = longitude = plant_date = None
+    if 'geo_point_2d.lat' in df:
+        latitude = pd.to_numeric(df['geo_point_2d.lat'], errors='coerce')
+        longitude = pd.to_numeric(df['geo_point_2d.lon'], errors='coerce')
+    if 'date_planted' in df:
+        plant_date = parse_date_planted(df['date_planted'])
+    return canonical_frame(
+        df['tree_id'], field('common_name'), field('species_name'), field('height_range'), field('diameter'),
+        plant_date, latitude, longitude)
+
+
+def normalized(records):
+    return from_api(pd.json_normalize(records))
+
+
+def decoded(records):
+    columns = RecordColumns(len(records))
+    for start in range(0, len(records), PAGE_SIZE):
+        columns.add(records[start:start + PAGE_SIZE])
+    return columns.frame()
+
+
+def best(func, records, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        df = func(records)
+        times.append(time.perf_counter() - start)
+    return min(times), df
+
+
+def main(runs=3):
+    rows = load_records()
+    print(f"{'records':>9}  {'fields':<8}{'json_normalize ms':>19}{'RecordColumns ms':>18}{'speedup':>9}")
+    for size in SIZES:
+        for label, fields in (("all", None), ("select", SELECT_FIELDS)):
+            records = to_records(rows.head(size), fields)
+            normalize_s, expected = best(normalized, records, runs)
+            decode_s, df = best(decoded, records, runs)
+            pd.testing.assert_frame_equal(df, expected)
+            print(f"{size:>9}  {label:<8}{normalize_s * 1e3:>19.0f}{decode_s * 1e3:>18.0f}"
+                  f"{normalize_s / decode_s:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Bytes transferred and decode time per neighbourhood, all fields vs SELECT_FIELDS.
+
+Fetches every records page of each neighbourhood from the local stand-in API,
+once without ``select`` and once with it, and reports bytes on the wire (gzip),
+uncompressed body bytes, response.json() time, and the time to decode the
+records into trees.parse.RecordColumns and build the frame.
+
+    python -m benchmarks.api_select
+"""
+import time
+
+from trees.api import MAX_OFFSET, PAGE_SIZE, RECORDS_PATH, SELECT_FIELDS, ApiClient, neighbourhood_filter
+from trees.local_api import start_server
+from trees.parse import RecordColumns
+
+NEIGHBOURHOODS = ["STRATHCONA", "KITSILANO", "HASTINGS-SUNRISE"]
+
+
+def measure(client, neighbourhood, fields):
+    params = {"limit": PAGE_SIZE, "where": neighbourhood_filter(neighbourhood)}
+    if fields is not None:
+        params["select"] = ",".join(fields)
+    wire = body = 0
+    decode = 0.0
+    pages = []
+    offset, total = 0, 1
+    while offset < min(total, MAX_OFFSET):
+        response = client.get(RECORDS_PATH, {**params, "offset": offset})
+        wire += int(response.headers["Content-Length"])
+        body += len(response.content)
+        start = time.perf_counter()
+        page = response.json()
+        decode += time.perf_counter() - start
+        total = page["total_count"]
+        pages.append(page["results"])
+        offset += PAGE_SIZE
+    start = time.perf_counter()
+    columns = RecordColumns()
+    for page in pages:
+        columns.add(page)
+    df = columns.frame()
+    return wire, body, decode, time.perf_counter() - start, len(df)
+
+
+def main():
+    server, base_url = start_server()
+    client = ApiClient(base_url)
+    print(f"{'neighbourhood':<18}{'fields':<8}{'wire MB':>9}{'body MB':>9}{'json ms':>9}{'frame ms':>10}")
+    try:
+        for name in NEIGHBOURHOODS:
+            for label, fields in (("all", None), ("select", SELECT_FIELDS)):
+                wire, body, decode, frame, rows = measure(client, name, fields)
+                print(f"{name:<18}{label:<8}{wire / 1e6:>9.2f}{body / 1e6:>9.2f}"
+                      f"{decode * 1000:>9.0f}{frame * 1000:>10.0f}")
+    finally:
+        client.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Time to the statistics panel in API mode: aggregate queries vs downloading every record.
+
+Runs against the local stand-in API with every response delayed by --latency
+seconds.
+
+    python -m benchmarks.api_summary [--latency 0.05]
+"""
+import argparse
+import time
+
+from trees.api import ApiClient, fetch_api_data, fetch_summary
+from trees.local_api import start_server
+from trees.parse import located
+from trees.summary import summarize
+
+NEIGHBOURHOODS = ["STRATHCONA", "KITSILANO", "RENFREW-COLLINGWOOD"]
+
+
+def timed(func, base_url):
+    client = ApiClient(base_url)
+    start = time.perf_counter()
+    summary = func(client)
+    return time.perf_counter() - start, client.metrics()["requests"], summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+    server, base_url = start_server(latency=args.latency)
+    print(f"{'neighbourhood':<22}{'trees':>7}{'records s':>11}{'requests':>10}{'aggregate s':>13}{'requests':>10}")
+    try:
+        for name in NEIGHBOURHOODS:
+            records_s, records_requests, expected = timed(
+                lambda client: summarize(located(fetch_api_data(name, print, client))), base_url)
+            aggregate_s, aggregate_requests, summary = timed(lambda client: fetch_summary(name, client), base_url)
+            assert summary["top_types"] == expected["top_types"]
+            print(f"{name:<22}{summary['rows']:>7}{records_s:>11.2f}{records_requests:>10}"
+                  f"{aggregate_s:>13.2f}{aggregate_requests:>10}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""Time the CSV-to-canonical conversion (trees.parse.from_csv) on the whole city.
+
+    python -m benchmarks.parse_data
+"""
+import time
+
+from trees.dataset import CSV_PATH
+from trees.parse import from_csv, located
+from trees.schema import read_trees_csv
+
+
+def main(runs=5):
+    df = read_trees_csv(CSV_PATH)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        parsed = located(from_csv(df))
+        times.append(time.perf_counter() - start)
+    print(f"from_csv on {len(df)} rows ({len(parsed)} kept): best of {runs} {min(times) * 1e3:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Report the memory held by parsed (canonical) frames, per neighbourhood and citywide.
+
+Frames are parsed from the CSV as read in CSV mode (typed schema) and from the
+untyped read the dashboard originally used. Sizes are memory_usage(deep=True).
+
+    python -m benchmarks.parse_memory
+"""
+import pandas as pd
+
+from trees.dataset import CSV_PATH, get_dataset
+from trees.parse import from_csv, located
+
+
+def parse_data(df):
+    return located(from_csv(df))
+
+
+def megabytes(df):
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def main():
+    dataset = get_dataset()
+    untyped = pd.read_csv(CSV_PATH, sep=";")
+    keys = untyped["NEIGHBOURHOOD_NAME"].str.upper()
+    print(f"{'neighbourhood':<28}{'rows':>7}{'typed MB':>10}{'untyped MB':>12}")
+    for name in dataset.neighbourhoods:
+        parsed = parse_data(dataset.neighbourhood(name))
+        print(f"{name:<28}{len(parsed):>7}{megabytes(parsed):>10.2f}"
+              f"{megabytes(parse_data(untyped[keys == name])):>12.2f}")
+    parsed = parse_data(dataset.frame)
+    print(f"{'CITYWIDE':<28}{len(parsed):>7}{megabytes(parsed):>10.2f}{megabytes(parse_data(untyped)):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
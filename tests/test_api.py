@@ -0,0 +1,74 @@
+"""The API client against the local stand-in API (trees.local_api), which serves data/public-trees.csv.
+
+    python -m pytest tests
+"""
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from trees.api import ApiClient, fetch_api_data
+from trees.api_cache import CHECKPOINT_MAX_AGE, PageCheckpoint
+from trees.local_api import start_server
+from trees.parse import located
+from trees.sources import LocalSource
+
+# More trees than the API's offset limit, so the download is split into tree_id ranges
+LARGE_NEIGHBOURHOOD = "HASTINGS-SUNRISE"
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server, url = start_server()
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture(scope="module")
+def flaky_url():
+    # Seeded, so the same requests fail on every run
+    server, url = start_server(error_rate=0.03, seed=1)
+    yield url
+    server.shutdown()
+
+
+def test_large_neighbourhood_matches_csv(base_url):
+    df = located(fetch_api_data(LARGE_NEIGHBOURHOOD, client=ApiClient(base_url)))
+    expected = LocalSource().load(LARGE_NEIGHBOURHOOD)
+    assert len(expected) > 10_000
+    pd.testing.assert_frame_equal(df.sort_values("tree_id", ignore_index=True),
+                                  expected.sort_values("tree_id", ignore_index=True), check_categorical=False)
+
+
+def test_resumed_download_matches_fresh_one(base_url, flaky_url, tmp_path):
+    checkpoint = PageCheckpoint(["test", LARGE_NEIGHBOURHOOD], path=str(tmp_path))
+    errors = []
+    partial = fetch_api_data(LARGE_NEIGHBOURHOOD, errors.append, ApiClient(flaky_url, retries=0),
+                             checkpoint=checkpoint)
+    assert errors
+    assert os.listdir(checkpoint.path)
+
+    resumed_client = ApiClient(base_url)
+    resumed = fetch_api_data(LARGE_NEIGHBOURHOOD, client=resumed_client, checkpoint=checkpoint)
+    fresh_client = ApiClient(base_url)
+    fresh = fetch_api_data(LARGE_NEIGHBOURHOOD, client=fresh_client)
+    pd.testing.assert_frame_equal(resumed, fresh)
+    assert len(partial) < len(fresh)
+    # Pages saved by the failed run are read back instead of requested again, then cleared
+    assert resumed_client.metrics()["requests"] < fresh_client.metrics()["requests"]
+    assert not os.path.exists(checkpoint.path)
+
+
+def test_abandoned_checkpoints_are_pruned(tmp_path):
+    abandoned = PageCheckpoint(["test", "KITSILANO", "old version"], path=str(tmp_path))
+    abandoned.save("offset-100", [{"tree_id": 1}])
+    recent = PageCheckpoint(["test", "KITSILANO", "other fields"], path=str(tmp_path))
+    recent.save("offset-100", [{"tree_id": 1}])
+    long_ago = time.time() - CHECKPOINT_MAX_AGE - 60
+    for path in (abandoned.path, abandoned.task_path("offset-100")):
+        os.utime(path, (long_ago, long_ago))
+
+    PageCheckpoint(["test", "KITSILANO", "new version"], path=str(tmp_path))
+    assert not os.path.exists(abandoned.path)
+    assert recent.pages("offset-100") == [[{"tree_id": 1}]]
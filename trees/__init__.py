@@ -0,0 +1 @@
+"""Data layer for the Vancouver Trees Dashboard."""
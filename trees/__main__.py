@@ -0,0 +1,43 @@
+import argparse
+
+from trees.build import ARTIFACTS, build
+from trees.dataset import CSV_PATH
+from trees.local_api import make_server
+from trees.sync import sync
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m trees", description="Vancouver Trees Dashboard data tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="precompute the stores and sidecars the dashboard serves from")
+    build_parser.add_argument("--only", nargs="+", choices=ARTIFACTS, default=ARTIFACTS,
+                              help="build only these artifacts")
+
+    serve_parser = commands.add_parser("serve-api", help="serve the CSV through a local stand-in of the records API")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--latency", type=float, default=0.0, help="seconds to delay every response")
+    serve_parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds of delay")
+    serve_parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests to fail")
+    serve_parser.add_argument("--error-status", type=int, default=503, help="HTTP status of failed requests")
+    serve_parser.add_argument("--seed", type=int, help="seed for jitter and failures, to repeat a run")
+    serve_parser.add_argument("--csv", default=CSV_PATH, help=f"source CSV (default: {CSV_PATH})")
+
+    sync_parser = commands.add_parser("sync", help="bring API mode's on-disk cache up to the API's current data")
+    sync_parser.add_argument("--full", action="store_true", help="download everything, not just new trees")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build(args.only)
+    elif args.command == "serve-api":
+        server = make_server(args.host, args.port, args.latency, args.csv, jitter=args.jitter,
+                             error_rate=args.error_rate, error_status=args.error_status, seed=args.seed)
+        print(f"Serving the records API on http://{args.host}:{args.port}")
+        server.serve_forever()
+    elif args.command == "sync":
+        sync(full=args.full)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""Client for the City of Vancouver Opendatasoft API (public-trees dataset)."""
+import json
+import os
+import random
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from trees.api_cache import validators
+from trees.parse import RecordColumns
+from trees.schema import CHUNK_ROWS, CSV_COLUMNS, CSV_SEP, stream_trees_csv
+from trees.summary import summary_from_aggregates
+
+# TREES_API_URL points the client at another server, e.g. the local stand-in (trees.local_api)
+BASE_URL = os.environ.get("TREES_API_URL", "https://opendata.vancouver.ca")
+DATASET_PATH = "/api/explore/v2.1/catalog/datasets/public-trees"
+RECORDS_PATH = DATASET_PATH + "/records"
+# The whole filtered dataset in one streamed response, as EXPORTS_PATH/<format>
+EXPORTS_PATH = DATASET_PATH + "/exports"
+EXPORT_FORMATS = ("csv", "jsonl")
+# Only the fields trees.parse.RecordColumns reads; the GeoJSON geom and the street fields stay on the server
+SELECT_FIELDS = ["tree_id", "common_name", "species_name", "height_range", "diameter", "date_planted",
+                 "geo_point_2d"]
+# CSV exports carry the columns trees.schema reads, by field name
+CSV_SELECT_FIELDS = [column.lower() for column in CSV_COLUMNS]
+# API data is re-fetched once per window of this many seconds
+API_TTL = 3600
+# The records endpoint serves at most PAGE_SIZE records per request and stops at offset MAX_OFFSET
+# (fetch_api_data gets past it by paging on tree_id)
+PAGE_SIZE = 100
+MAX_OFFSET = 10000
+# Pages requested at the same time after the first one
+MAX_WORKERS = 8
+# Past MAX_OFFSET, the tree_id span is split into this many key ranges per worker, to even out their sizes
+RANGES_PER_WORKER = 4
+# Seconds to wait for a connection, and then between bytes of a response
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+# Request latencies kept for ApiClient.metrics
+LATENCY_SAMPLES = 1000
+# A request failing with one of these (or a dropped connection or timeout) is retried up to RETRIES times,
+# after BACKOFF seconds, then twice as long after each further failure
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRIES = 4
+BACKOFF = 0.5
+# The longest wait before a retry, whatever a Retry-After header asks for
+MAX_BACKOFF = 30
+
+
+def neighbourhood_filter(neighbourhood):
+    return "neighbourhood_name='{}'".format(neighbourhood.replace("'", "''"))
+
+
+class ApiClient:
+    """One pooled, keep-alive HTTP session for every API request, with timeouts, retries and latency metrics.
+
+    The connection pool holds ``pool_size`` connections, so concurrent page
+    requests reuse them instead of opening a TCP/TLS connection each. A request
+    that fails transiently is retried ``retries`` times with exponential backoff
+    from ``backoff`` seconds (or the server's Retry-After, if longer). With a
+    trees.api_cache.ResponseCache, ``get_json(..., revalidate=True)`` keeps
+    responses on disk and only re-downloads them when the server says they changed.
+    """
+
+    def __init__(self, base_url=None, pool_size=MAX_WORKERS, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), cache=None,
+                 retries=RETRIES, backoff=BACKOFF):
+        self.base_url = base_url or BASE_URL
+        self.timeout = timeout
+        self.cache = cache
+        self.retries = retries
+        self.backoff = backoff
+        self.retried = 0
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = "gzip"
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def get(self, path, params=None, stream=False, headers=None):
+        """GET ``path``, retrying transient failures; with ``stream``, the latency recorded is the time to
+        the response headers, and only failures before them are retried."""
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout,
+                                            stream=stream, headers=headers)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+            else:
+                self.latencies.append(time.perf_counter() - start)
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    return response
+                retry_after = response.headers.get("Retry-After", "")
+                delay = self.backoff * 2 ** attempt
+                if retry_after.isdigit():
+                    delay = max(delay, min(int(retry_after), MAX_BACKOFF))
+                response.close()
+            self.retried += 1
+            # Jittered, so pages that failed together don't all retry at the same moment
+            time.sleep(delay * random.uniform(0.5, 1))
+
+    def get_json(self, path, params=None, revalidate=False):
+        """GET and decode ``path``; ``revalidate`` serves the cached body when the server answers 304."""
+        if not revalidate or self.cache is None:
+            return self.get(path, params).json()
+        url = f"{self.base_url}{path}"
+        entry = self.cache.lookup(url, params)
+        response = self.get(path, params, headers=validators(entry) if entry else None)
+        if response.status_code == 304 and entry:
+            return json.loads(entry["body"])
+        self.cache.store(url, params, response)
+        return response.json()
+
+    def metrics(self):
+        """Request count and latency percentiles, in milliseconds, over the recent requests."""
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return {"requests": 0, "retries": self.retried}
+        return {
+            "requests": len(latencies),
+            "retries": self.retried,
+            "mean_ms": statistics.fmean(latencies) * 1000,
+            "p50_ms": latencies[len(latencies) // 2] * 1000,
+            "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+            "max_ms": latencies[-1] * 1000,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class IncompleteFetch(Exception):
+    """The records received don't add up to the total count the API reported."""
+
+
+def fetch_data_version(client):
+    """When the dataset's records last changed, from its metadata (one conditional request with a cache)."""
+    metas = client.get_json(DATASET_PATH, revalidate=True).get("metas", {}).get("default", {})
+    return metas.get("data_processed") or metas.get("modified")
+
+
+def where_clause(neighbourhood, *clauses):
+    """Join the neighbourhood filter (None: the whole city) and ``clauses`` into one ``where``."""
+    clauses = ([neighbourhood_filter(neighbourhood)] if neighbourhood else []) + list(clauses)
+    return " and ".join(clauses) or None
+
+
+def fetch_page(client, where, offset=0, fields=SELECT_FIELDS, order_by="tree_id", limit=PAGE_SIZE):
+    params = {"limit": limit, "offset": offset, "order_by": order_by}
+    if where:
+        params["where"] = where
+    if fields is not None:
+        params["select"] = ",".join(fields)
+    return client.get(RECORDS_PATH, params).json()
+
+
+def fetch_offset_page(client, neighbourhood, offset, fields, sink):
+    sink(fetch_page(client, where_clause(neighbourhood), offset, fields)['results'])
+
+
+def fetch_key_range(client, neighbourhood, after, last, fields, sink):
+    """Pass every record with ``after < tree_id <= last`` (no upper bound if ``last`` is None) to ``sink``,
+    a page at a time, each page starting after the previous page's last id; returns the record count.
+
+    Keyset paging never uses an offset, so it isn't limited to MAX_OFFSET records.
+    """
+    received = 0
+    while True:
+        bounds = [f"tree_id > {after}"] + ([f"tree_id <= {last}"] if last is not None else [])
+        where = where_clause(neighbourhood, *bounds)
+        page = fetch_page(client, where, fields=fields)['results']
+        sink(page)
+        received += len(page)
+        if len(page) < PAGE_SIZE:
+            return received
+        after = page[-1]['tree_id']
+
+
+def run_task(task, client, neighbourhood, args, fields, sink, checkpoint=None):
+    """Run one fetch_api_data task; with a checkpoint, replay the pages it saved before and fetch only the rest."""
+    if checkpoint is None:
+        return task(client, neighbourhood, *args, fields, sink)
+    name = "-".join([task.__name__, *map(str, args)])
+    pages = checkpoint.pages(name)
+    for page in pages:
+        sink(page)
+    if pages and (task is fetch_offset_page or len(pages[-1]) < PAGE_SIZE):
+        return  # it had finished
+    if pages:
+        args = (pages[-1][-1]['tree_id'], *args[1:])  # a key range continues after its last saved page
+
+    def save(page):
+        checkpoint.save(name, page)
+        sink(page)
+
+    task(client, neighbourhood, *args, fields, save)
+
+
+def fetch_api_data(neighbourhood, on_error=None, client=None, max_workers=MAX_WORKERS, fields=SELECT_FIELDS,
+                   checkpoint=None):
+    """Download a neighbourhood's records (None: the whole city) as a trees.parse.COLUMNS frame.
+
+    The first page, in tree_id order, reports the total count. Up to MAX_OFFSET
+    records, the remaining pages are fetched concurrently by offset. Beyond it,
+    the tree_id span after the first page is split into disjoint ranges, each
+    keyset-paged concurrently. Each page is decoded straight into the typed
+    column buffers of a trees.parse.RecordColumns sized for the total count, and
+    the number received is checked against it.
+
+    On a page that fails even after the client's retries, or a short count,
+    ``on_error`` gets the message and the records received are returned. Pass a long-lived ``client`` to reuse its
+    connections across calls. Only ``fields`` are requested (None asks for
+    every field); those beyond SELECT_FIELDS come back as extra categorical
+    columns after COLUMNS.
+
+    With a trees.api_cache.PageCheckpoint for this dataset version, every page
+    after the first is saved as it arrives, and fetching again after a failure
+    reads back the pages saved instead of requesting them. The checkpoint is
+    cleared once the count has been checked.
+    """
+    client = client or ApiClient()
+    if fields is not None and 'tree_id' not in fields:
+        fields = ['tree_id', *fields]  # paging is keyed on it
+    columns = RecordColumns(extra=[field for field in fields or [] if field not in SELECT_FIELDS])
+    try:
+        first = fetch_page(client, where_clause(neighbourhood), 0, fields)
+        total = first.get('total_count', 0)
+        columns.reserve(total)
+        results = first.get('results', [])
+        columns.add(results)
+        if total <= MAX_OFFSET:
+            tasks = [(fetch_offset_page, offset) for offset in range(PAGE_SIZE, total, PAGE_SIZE)]
+        else:
+            newest = fetch_page(client, where_clause(neighbourhood), fields=['tree_id'], order_by="tree_id desc",
+                                limit=1)['results'][0]['tree_id']
+            after = results[-1]['tree_id']
+            count = max_workers * RANGES_PER_WORKER
+            bounds = sorted({after + (newest - after) * i // count for i in range(count + 1)})
+            tasks = [(fetch_key_range, low, high) for low, high in zip(bounds, bounds[1:])]
+        del first, results
+        with ThreadPoolExecutor(max_workers) as pool:
+            futures = [pool.submit(run_task, task, client, neighbourhood, args, fields, columns.add, checkpoint)
+                       for task, *args in tasks]
+            try:
+                for future in futures:
+                    future.result()
+            finally:
+                # After a failure, don't start pages nobody will use
+                for future in futures:
+                    future.cancel()
+        if checkpoint is not None:
+            checkpoint.clear()  # the fetch is complete, or the saved pages don't add up either
+        if columns.size != total:
+            raise IncompleteFetch(f"received {columns.size} of {total} records")
+    except Exception as e:
+        if on_error is not None:
+            on_error(f"API Error: {e}")
+    return columns.frame()
+
+
+def fetch_groups(client, where, field):
+    """[value, tree count] for every value of ``field`` among the trees matching ``where``."""
+    groups = []
+    while True:
+        params = {"where": where, "group_by": field, "select": f"{field}, count(*) as trees",
+                  "limit": PAGE_SIZE, "offset": len(groups)}
+        page = client.get_json(RECORDS_PATH, params)['results']
+        groups.extend(page)
+        if len(page) < PAGE_SIZE:
+            return [[group[field], group['trees']] for group in groups]
+
+
+def fetch_totals(client, where):
+    select = ("avg(diameter) as avg_diameter, min(diameter) as min_diameter, max(diameter) as max_diameter, "
+              "min(date_planted) as first_planted, max(date_planted) as last_planted")
+    return client.get_json(RECORDS_PATH, {"where": where, "select": select})['results'][0]
+
+
+def fetch_summary(neighbourhood, client=None):
+    """A neighbourhood's trees.summary.summarize dict from aggregate queries, without downloading its trees.
+
+    Counts per common name and per height range, and the diameter and planting
+    date extremes, are three concurrent requests. Like the dashboard, only trees
+    with a location are counted.
+    """
+    client = client or ApiClient()
+    where = where_clause(neighbourhood, "geo_point_2d is not null")
+    with ThreadPoolExecutor(3) as pool:
+        names = pool.submit(fetch_groups, client, where, "common_name")
+        heights = pool.submit(fetch_groups, client, where, "height_range")
+        totals = pool.submit(fetch_totals, client, where).result()
+
+    def year(date):
+        return int(str(date)[:4]) if date else None
+
+    return summary_from_aggregates(
+        names.result(), heights.result(), [totals['min_diameter'], totals['max_diameter']],
+        [year(totals['first_planted']), year(totals['last_planted'])], totals['avg_diameter'])
+
+
+def read_jsonl(response):
+    """Decode a JSON lines body as it arrives into a trees.parse.COLUMNS frame, CHUNK_ROWS records at a time."""
+    columns, batch = RecordColumns(), []
+    for line in response.iter_lines(chunk_size=1 << 16):
+        if line:
+            batch.append(json.loads(line))
+        if len(batch) == CHUNK_ROWS:
+            columns.add(batch)
+            batch = []
+    columns.add(batch)
+    return columns.frame()
+
+
+def fetch_export(neighbourhood=None, export_format="csv", on_error=None, client=None):
+    """Download a neighbourhood's records, or the whole city's, in one streamed export.
+
+    ``csv`` comes back with the CSV_COLUMNS of data/public-trees.csv and is read
+    with trees.schema's chunked CSV reader; ``jsonl`` holds the same SELECT_FIELDS
+    records as the records endpoint and comes back as COLUMNS. On failure,
+    ``on_error`` gets the message and an empty frame is returned.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"export_format must be one of {EXPORT_FORMATS}")
+    client = client or ApiClient()
+    params = {"where": neighbourhood_filter(neighbourhood)} if neighbourhood else {}
+    if export_format == "csv":
+        params.update(select=",".join(CSV_SELECT_FIELDS), delimiter=CSV_SEP, use_labels="true")
+    else:
+        params.update(select=",".join(SELECT_FIELDS))
+    try:
+        with client.get(f"{EXPORTS_PATH}/{export_format}", params, stream=True) as response:
+            if export_format == "jsonl":
+                return read_jsonl(response)
+            response.raw.decode_content = True  # let urllib3 gunzip as pandas reads
+            return stream_trees_csv(response.raw)
+    except Exception as e:
+        if on_error is not None:
+            on_error(f"API Error: {e}")
+        return pd.DataFrame()
@@ -0,0 +1,253 @@
+"""On-disk caches for API mode, so restarts and other processes don't re-download unchanged data.
+
+ResponseCache keeps response bodies with their ETag / Last-Modified validators
+for conditional requests; FrameCache keeps each neighbourhood's canonical
+frame stamped with the dataset version it was downloaded at; PageCheckpoint
+keeps the pages of a download that hasn't finished yet.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from trees.parse import COLUMNS
+from trees.store import STORE_FORMAT
+
+CACHE_PATH = "data/api-cache"
+CHECKPOINT_PATH = os.path.join(CACHE_PATH, "checkpoints")
+# Parquet schema metadata keys on cached frames
+VERSION_KEY = b"trees.data_version"
+FORMAT_KEY = b"trees.format"
+FETCHED_KEY = b"trees.fetched_at"
+# After a background refresh of a neighbourhood fails, it isn't tried again for this many seconds
+REFRESH_BACKOFF = 300
+# Checkpoints nothing has written to for this many seconds belong to downloads that were abandoned or whose
+# dataset version has been superseded
+CHECKPOINT_MAX_AGE = 24 * 3600
+
+
+def write_atomic(path, data):
+    # Concurrent readers see the old file or the new one, never half of one. Every writer, in any
+    # process or thread, gets its own temp file, so concurrent writes of one path can't clash.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ResponseCache:
+    """Response bodies on disk, keyed by URL and query, with the validators to revalidate them."""
+
+    def __init__(self, path=os.path.join(CACHE_PATH, "responses")):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def entry_path(self, url, params=None):
+        key = hashlib.sha256(f"{url}?{urlencode(sorted((params or {}).items()))}".encode()).hexdigest()
+        return os.path.join(self.path, key + ".json")
+
+    def lookup(self, url, params=None):
+        """The stored ``{"etag", "last_modified", "body"}`` entry, or None."""
+        try:
+            with open(self.entry_path(url, params)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, url, params, response):
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if etag is None and last_modified is None:
+            return  # nothing to revalidate with
+        entry = {"etag": etag, "last_modified": last_modified, "body": response.text}
+        write_atomic(self.entry_path(url, params), json.dumps(entry).encode())
+
+
+def validators(entry):
+    """Conditional request headers for a ResponseCache entry."""
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+class FrameCache:
+    """trees.parse.COLUMNS frames on disk, one Parquet file per neighbourhood (or the whole city).
+
+    It also keeps track of the background refreshes (trees.sources.ApiSource)
+    writing to it, so every source sharing the cache sees the same ones:
+    ``changes`` tells when one has swapped in new data, or a failed one may be
+    tried again.
+    """
+
+    def __init__(self, path=os.path.join(CACHE_PATH, "frames")):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.lock = threading.Lock()
+        self.refreshing = set()  # frame paths being downloaded
+        self.refresh_failed = {}  # frame path -> when its last refresh failed, until it may be retried
+        self.generation = 0  # refreshes that swapped in new data
+        self.retries_due = 0  # failed refreshes whose backoff has passed
+
+    def frame_path(self, neighbourhood):
+        return os.path.join(self.path, f"{(neighbourhood or 'CITYWIDE').upper()}.parquet")
+
+    def metadata(self, neighbourhood):
+        """The cached frame's schema metadata, or None if there is no usable frame."""
+        try:
+            metadata = pq.read_schema(self.frame_path(neighbourhood)).metadata or {}
+        except (OSError, pa.ArrowInvalid):
+            return None
+        if metadata.get(FORMAT_KEY) != str(STORE_FORMAT).encode() or VERSION_KEY not in metadata:
+            return None
+        return metadata
+
+    def data_version(self, neighbourhood):
+        """The dataset version the cached frame was downloaded at, or None if there is no usable frame."""
+        metadata = self.metadata(neighbourhood)
+        return metadata[VERSION_KEY].decode() if metadata else None
+
+    def get(self, neighbourhood, data_version):
+        """The cached frame if it was downloaded at ``data_version``, else None."""
+        if self.data_version(neighbourhood) != str(data_version):
+            return None
+        return self.latest(neighbourhood)
+
+    def latest(self, neighbourhood):
+        """The cached frame, whatever version it was downloaded at, or None.
+
+        ``attrs`` carry its ``data_version`` and, if known, when it was
+        downloaded (``fetched_at``, seconds since the epoch).
+        """
+        metadata = self.metadata(neighbourhood)
+        if metadata is None:
+            return None
+        try:
+            df = pd.read_parquet(self.frame_path(neighbourhood), columns=list(COLUMNS)).astype(COLUMNS)
+        except (OSError, pa.ArrowInvalid):
+            return None  # replaced or removed since the metadata was read
+        df.attrs["data_version"] = metadata[VERSION_KEY].decode()
+        df.attrs["fetched_at"] = float(metadata[FETCHED_KEY]) if FETCHED_KEY in metadata else None
+        return df
+
+    def claim_refresh(self, neighbourhood):
+        """Whether the caller should start a background refresh: none is underway, nor failed recently."""
+        key = self.frame_path(neighbourhood)
+        with self.lock:
+            if key in self.refreshing or time.time() - self.refresh_failed.get(key, 0) < REFRESH_BACKOFF:
+                return False
+            self.refreshing.add(key)
+            return True
+
+    def is_refreshing(self, neighbourhood):
+        with self.lock:
+            return self.frame_path(neighbourhood) in self.refreshing
+
+    def finish_refresh(self, neighbourhood, succeeded):
+        key = self.frame_path(neighbourhood)
+        with self.lock:
+            self.refreshing.discard(key)
+            if succeeded:
+                self.refresh_failed.pop(key, None)
+                self.generation += 1
+            else:
+                self.refresh_failed[key] = time.time()
+
+    def changes(self):
+        """A value that changes whenever a refresh has swapped in new data or a failed one is due a retry."""
+        with self.lock:
+            now = time.time()
+            for key, failed_at in list(self.refresh_failed.items()):
+                if now - failed_at >= REFRESH_BACKOFF:
+                    del self.refresh_failed[key]
+                    self.retries_due += 1
+            return self.generation, self.retries_due
+
+    def put(self, neighbourhood, data_version, df):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            VERSION_KEY: str(data_version).encode(),
+            FORMAT_KEY: str(STORE_FORMAT).encode(),
+            FETCHED_KEY: str(df.attrs.get("fetched_at") or time.time()).encode(),
+        })
+        sink = pa.BufferOutputStream()
+        pq.write_table(table, sink)
+        write_atomic(self.frame_path(neighbourhood), sink.getvalue().to_pybytes())
+
+
+def prune_checkpoints(path=CHECKPOINT_PATH, max_age=CHECKPOINT_MAX_AGE, keep=None):
+    """Remove the checkpoints under ``path``, other than ``keep``, not written to for ``max_age`` seconds."""
+    cutoff = time.time() - max_age
+    try:
+        entries = [entry for entry in os.scandir(path) if entry.is_dir() and entry.path != keep]
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            # Pages are appended, which leaves the directory's own mtime alone
+            written = max([entry.stat().st_mtime, *(page.stat().st_mtime for page in os.scandir(entry.path))])
+        except OSError:
+            continue  # cleared meanwhile
+        if written < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+class PageCheckpoint:
+    """The pages one download has received so far, so a restarted download continues where it stopped.
+
+    ``key`` names everything the pages depend on (e.g. neighbourhood, dataset
+    version and fields). Each task of trees.api.fetch_api_data (an offset page or
+    a tree_id range) appends its pages to its own file, one JSON list per line.
+    Starting a checkpoint prunes the others that have been left behind (see
+    CHECKPOINT_MAX_AGE).
+    """
+
+    def __init__(self, key, path=CHECKPOINT_PATH):
+        name = hashlib.sha256(json.dumps(key).encode()).hexdigest()
+        self.path = os.path.join(path, name)
+        prune_checkpoints(path, keep=self.path)
+        os.makedirs(self.path, exist_ok=True)
+
+    def task_path(self, task):
+        return os.path.join(self.path, task + ".jsonl")
+
+    def pages(self, task):
+        """The pages saved for ``task``, in the order they were fetched."""
+        pages = []
+        try:
+            with open(self.task_path(task)) as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        raise ValueError("page cut short")
+                    pages.append(json.loads(line))
+        except OSError:
+            return []
+        except ValueError:
+            # A page cut short by the interruption: keep the ones before it, so appends stay readable
+            write_atomic(self.task_path(task), "".join(json.dumps(page) + "\n" for page in pages).encode())
+        return pages
+
+    def save(self, task, page):
+        with open(self.task_path(task), "a") as f:
+            f.write(json.dumps(page) + "\n")
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,85 @@
+"""Memory-mapped column store for the public trees data.
+
+Numeric columns are saved as ``.npy`` files and categorical columns as their
+integer codes, all sorted by neighbourhood. Readers ``np.load`` them with
+``mmap_mode="r"``, so every Streamlit session and every process on the host
+shares the same read-only pages of the OS file cache instead of holding its
+own copy. Built by ``python -m trees build``.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from trees.dataset import CSV_PATH, file_signature
+from trees.parse import COLUMNS
+from trees.store import MANIFEST, STORE_FORMAT, is_fresh, read_manifest, scratch_dir, swap_in
+
+ARRAYS_PATH = "data/public-trees.npy"
+
+# Stored in exactly the trees.parse.COLUMNS dtypes, so readers never convert
+CATEGORICAL_COLUMNS = [name for name, dtype in COLUMNS.items() if dtype == "category"]
+NUMERIC_COLUMNS = {name: dtype for name, dtype in COLUMNS.items() if dtype != "category"}
+
+
+def build_arrays(dataset, arrays_path=ARRAYS_PATH):
+    """Write a TreeDataset of trees.parse.COLUMNS frames as mapped columns."""
+    df = dataset.frame
+    tmp_path = scratch_dir(arrays_path)
+    for name, dtype in NUMERIC_COLUMNS.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), df[name].to_numpy(dtype=dtype))
+    categories = {}
+    for name in CATEGORICAL_COLUMNS:
+        column = df[name].cat.remove_unused_categories()
+        # Codes keep the width pandas picks for this many categories, so readers don't recast them
+        np.save(os.path.join(tmp_path, f"{name}.codes.npy"), column.cat.codes.to_numpy())
+        categories[name] = column.cat.categories.tolist()
+
+    with open(os.path.join(tmp_path, MANIFEST), "w") as f:
+        json.dump({**dataset.source_info(), "format": STORE_FORMAT, "rows": len(df), "categories": categories,
+                   "partitions": {name: [rows.start, rows.stop] for name, rows in dataset.partitions.items()}},
+                  f, indent=2)
+    swap_in(tmp_path, arrays_path)
+    return arrays_path
+
+
+class ColumnStore:
+    """Read-only memory-mapped columns with per-neighbourhood row ranges."""
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.partitions = {name: slice(*bounds) for name, bounds in manifest["partitions"].items()}
+        self.numeric = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                        for name in NUMERIC_COLUMNS}
+        self.codes = {name: np.load(os.path.join(path, f"{name}.codes.npy"), mmap_mode="r")
+                      for name in CATEGORICAL_COLUMNS}
+        self.dtypes = {name: pd.CategoricalDtype(manifest["categories"][name])
+                       for name in CATEGORICAL_COLUMNS}
+
+    def neighbourhood(self, name):
+        rows = self.partitions.get(name.upper(), slice(0, 0))
+        columns = {column: self.numeric[column][rows] if column in self.numeric else
+                   pd.Categorical.from_codes(self.codes[column][rows], dtype=self.dtypes[column], validate=False)
+                   for column in COLUMNS}
+        # copy=False keeps every column a view onto the mapped files. Built in COLUMNS order, as selecting
+        # columns afterwards would copy them all on pandas without copy-on-write
+        return pd.DataFrame(columns, copy=False)
+
+
+_stores = {}
+_lock = threading.Lock()
+
+
+def open_column_store(arrays_path=ARRAYS_PATH, csv_path=CSV_PATH):
+    """Return the process-wide store, or None when it is missing or older than the CSV."""
+    if not is_fresh(arrays_path, csv_path):
+        return None
+    with _lock:
+        signature = file_signature(os.path.join(arrays_path, MANIFEST))
+        cached = _stores.get(arrays_path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, ColumnStore(arrays_path, read_manifest(arrays_path)))
+            _stores[arrays_path] = cached
+        return cached[1]
@@ -0,0 +1,24 @@
+"""Offline build of every artifact the dashboard can serve from."""
+from trees.arrays import ARRAYS_PATH, build_arrays
+from trees.csv_index import INDEX_PATH, build_index
+from trees.dataset import CSV_PATH, TreeDataset
+from trees.parse import from_csv
+from trees.store import STORE_PATH, build_store
+from trees.summary import SUMMARY_PATH, build_summary
+
+ARTIFACTS = ["store", "arrays", "index", "summary"]
+
+
+def build(artifacts=ARTIFACTS, log=print):
+    # Parse the CSV into the canonical columns once; every artifact is written from the same frame. Always
+    # CSV_PATH: the readers check the artifacts against it, so ones built from another file would be stale
+    dataset = TreeDataset.from_csv(CSV_PATH).map(from_csv)
+    log(f"Parsed {len(dataset.frame)} trees in {len(dataset.neighbourhoods)} neighbourhoods from {CSV_PATH}")
+    if "store" in artifacts:
+        log(f"Wrote {build_store(dataset, STORE_PATH)}")
+    if "arrays" in artifacts:
+        log(f"Wrote {build_arrays(dataset, ARRAYS_PATH)}")
+    if "index" in artifacts:
+        log(f"Wrote {build_index(CSV_PATH, INDEX_PATH)}")
+    if "summary" in artifacts:
+        log(f"Wrote {build_summary(dataset, SUMMARY_PATH)}")
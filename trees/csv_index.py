@@ -0,0 +1,96 @@
+"""Byte-range index of the public trees CSV by neighbourhood.
+
+The sidecar lists, for every NEIGHBOURHOOD_NAME, the byte ranges of the CSV
+that hold its rows (adjacent rows are merged into one range). Readers seek to
+those ranges and parse only that neighbourhood. Built by
+``python -m trees build``.
+"""
+import io
+import json
+import threading
+
+import numpy as np
+
+from trees.dataset import CSV_PATH, file_signature
+from trees.schema import read_trees_csv
+
+INDEX_PATH = "data/public-trees.csv.index.json"
+
+
+def build_index(csv_path=CSV_PATH, index_path=INDEX_PATH):
+    signature = file_signature(csv_path)
+    with open(csv_path, "rb") as f:
+        data = f.read()
+    ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("\n")) + 1
+    if len(ends) == 0 or ends[-1] != len(data):
+        ends = np.append(ends, len(data))
+
+    names = read_trees_csv(io.BytesIO(data), columns=["NEIGHBOURHOOD_NAME"])["NEIGHBOURHOOD_NAME"].str.upper()
+    if len(names) != len(ends) - 1:
+        raise ValueError(f"{csv_path} has quoted newlines; rows can't be indexed by line")
+
+    # Row i spans [ends[i], ends[i + 1]); merge runs of the same neighbourhood into one range
+    starts = np.flatnonzero(names.ne(names.shift()).to_numpy())
+    stops = np.append(starts[1:], len(names))
+    ranges = {}
+    for start, stop in zip(starts, stops):
+        name = names.iat[start]
+        if isinstance(name, str):
+            ranges.setdefault(name, []).append([int(ends[start]), int(ends[stop])])
+
+    with open(index_path, "w") as f:
+        json.dump({"source": csv_path, "mtime_ns": signature[0], "size": signature[1],
+                   "header": [0, int(ends[0])], "ranges": ranges}, f)
+    return index_path
+
+
+class IndexedCsv:
+    """Parses each neighbourhood from its byte ranges on first use, then keeps it."""
+
+    def __init__(self, csv_path, index):
+        self.csv_path = csv_path
+        self.signature = (index["mtime_ns"], index["size"])
+        self.header = index["header"]
+        self.ranges = index["ranges"]
+        self.frames = {}
+        self.lock = threading.Lock()
+
+    def read_ranges(self, ranges):
+        with open(self.csv_path, "rb") as f:
+            chunks = []
+            for start, stop in [self.header] + ranges:
+                f.seek(start)
+                chunks.append(f.read(stop - start))
+        return read_trees_csv(io.BytesIO(b"".join(chunks)))
+
+    def neighbourhood(self, name):
+        name = name.upper()
+        with self.lock:
+            if name not in self.frames:
+                self.frames[name] = self.read_ranges(self.ranges.get(name, []))
+            return self.frames[name]
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def open_indexed_csv(csv_path=CSV_PATH, index_path=INDEX_PATH):
+    """Return the process-wide indexed reader, or None when the index is missing or stale."""
+    with _lock:
+        try:
+            signature = file_signature(csv_path)
+        except OSError:
+            return None
+        cached = _indexes.get(index_path)
+        if cached is None or cached.signature != signature:
+            try:
+                with open(index_path) as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                return None
+            if (index["mtime_ns"], index["size"]) != signature:
+                return None
+            cached = IndexedCsv(csv_path, index)
+            _indexes[index_path] = cached
+        return cached
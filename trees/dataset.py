@@ -0,0 +1,71 @@
+"""Process-wide, parse-once view of the public trees CSV."""
+import os
+import threading
+
+import numpy as np
+from trees.schema import read_trees_csv
+
+CSV_PATH = "data/public-trees.csv"
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class TreeDataset:
+    """The whole CSV, stored sorted by neighbourhood so each one is a contiguous slice."""
+
+    def __init__(self, path, signature, frame, partitions):
+        self.path = path
+        self.signature = signature
+        self.frame = frame
+        self.partitions = partitions
+
+    @classmethod
+    def from_csv(cls, path=CSV_PATH):
+        signature = file_signature(path)
+        df = read_trees_csv(path)
+        keys = df["NEIGHBOURHOOD_NAME"].str.upper()
+        indices = keys.groupby(keys, sort=True).indices
+
+        # Reorder once so every neighbourhood is a single [start, stop) run of rows
+        partitions, start = {}, 0
+        for name, rows in indices.items():
+            partitions[name] = slice(start, start + len(rows))
+            start += len(rows)
+        order = np.concatenate(list(indices.values())) if indices else np.empty(0, dtype=np.intp)
+        frame = df.take(order).reset_index(drop=True)
+        return cls(path, signature, frame, partitions)
+
+    def map(self, func):
+        """Return a dataset over ``func(frame)``, which must keep the row order."""
+        return TreeDataset(self.path, self.signature, func(self.frame), self.partitions)
+
+    def source_info(self):
+        return {"source": self.path, "mtime_ns": self.signature[0], "size": self.signature[1]}
+
+    @property
+    def neighbourhoods(self):
+        return list(self.partitions)
+
+    def neighbourhood(self, name):
+        rows = self.partitions.get(name.upper())
+        if rows is None:
+            return self.frame.iloc[0:0]
+        return self.frame.iloc[rows]
+
+
+_datasets = {}
+_lock = threading.Lock()
+
+
+def get_dataset(path=CSV_PATH):
+    """Return the shared dataset for ``path``, re-reading it only when the file changes."""
+    with _lock:
+        signature = file_signature(path)
+        dataset = _datasets.get(path)
+        if dataset is None or dataset.signature != signature:
+            dataset = TreeDataset.from_csv(path)
+            _datasets[path] = dataset
+        return dataset
@@ -0,0 +1,361 @@
+"""Local stand-in for the Opendatasoft records and exports API, serving data/public-trees.csv.
+
+Used to benchmark and exercise trees.api without touching opendata.vancouver.ca,
+with optional latency, jitter and injected errors. Start it with ``python -m trees
+serve-api`` and point the client at it with ``TREES_API_URL=http://127.0.0.1:8765``;
+``python -m benchmarks.api_harness`` runs the client against it.
+"""
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import chain
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from trees.api import DATASET_PATH, EXPORTS_PATH, MAX_OFFSET, PAGE_SIZE, RECORDS_PATH
+from trees.dataset import CSV_PATH
+from trees.schema import CSV_SEP
+
+CLAUSE = re.compile(r"^\s*(\w+)\s*(=|!=|>=|<=|>|<)\s*('(?:[^']|'')*'|-?\d+(?:\.\d+)?)\s*$")
+NULL_CLAUSE = re.compile(r"^\s*(\w+)\s+is\s+(not\s+)?null\s*$", re.IGNORECASE)
+# An aggregate in ``select``, e.g. "count(*) as trees" or "avg(diameter)"
+AGGREGATE = re.compile(r"^(count|sum|avg|min|max)\((\*|\w+)\)(?:\s+as\s+(\w+))?$", re.IGNORECASE)
+AGGREGATES = {
+    "count": lambda column: int(column.count()),
+    "sum": lambda column: column.sum(),
+    "avg": lambda column: column.mean(),
+    "min": lambda column: column.min(),
+    "max": lambda column: column.max(),
+}
+# Match positions kept for reuse by TreeApi.where, least recently used dropped first
+MATCH_CACHE_SIZE = 256
+# Export responses are serialized and sent this many records at a time
+EXPORT_CHUNK_ROWS = 5000
+OPERATORS = {
+    "=": lambda column, value: column == value,
+    "!=": lambda column, value: column != value,
+    ">": lambda column, value: column > value,
+    ">=": lambda column, value: column >= value,
+    "<": lambda column, value: column < value,
+    "<=": lambda column, value: column <= value,
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def load_records(csv_path=CSV_PATH):
+    """The CSV with the API's lowercase field names; Geom and geo_point_2d stay as text until served.
+
+    ``attrs["labels"]`` maps each field back to its CSV header, which exports use with ``use_labels``;
+    ``attrs["modified"]`` is the CSV's mtime, reported as the dataset's last change.
+    """
+    df = pd.read_csv(csv_path, sep=CSV_SEP, low_memory=False)
+    labels = {column.lower(): column for column in df.columns}
+    df.columns = list(labels)
+    df = df.sort_values("tree_id", ignore_index=True)
+    df.attrs["labels"] = labels
+    df.attrs["modified"] = os.stat(csv_path).st_mtime
+    return df
+
+
+def parse_order(expression, columns):
+    """The field and direction of an ``order_by`` of one field, optionally followed by asc or desc."""
+    field, _, direction = expression.strip().partition(" ")
+    direction = direction.strip().lower() or "asc"
+    if field not in columns or direction not in ("asc", "desc"):
+        raise BadRequest(f"Unsupported order_by: {expression}")
+    return field, direction == "asc"
+
+
+def to_records(rows, fields=None):
+    """API records for ``rows``, with only ``fields`` when given."""
+    records = []
+    for record in rows.to_dict("records"):
+        record = {field: None if value != value else value for field, value in record.items()}  # NaN -> null
+        if fields is not None and "geom" not in fields and "geo_point_2d" not in fields:
+            records.append({field: record[field] for field in fields})
+            continue
+        geom = record.pop("geom")
+        geometry = json.loads(geom) if geom is not None else None
+        if geometry is None:
+            record["geom"] = record["geo_point_2d"] = None
+        else:
+            lon, lat = geometry["coordinates"]
+            record["geom"] = {"type": "Feature", "geometry": geometry, "properties": {}}
+            record["geo_point_2d"] = {"lon": lon, "lat": lat}
+        records.append(record if fields is None else {field: record[field] for field in fields})
+    return records
+
+
+class TreeApi:
+    """The query semantics of the records and exports endpoints, over an in-memory frame.
+
+    ``where`` takes ``and``-ed comparisons of a field with a literal or ``is [not]
+    null``, ``select`` a comma-separated list of field names, ``order_by`` one
+    field. With ``group_by`` or aggregates (count, sum, avg, min, max) in
+    ``select``, records are one result per group instead.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.labels = df.attrs.get("labels", {})
+        self.modified = df.attrs.get("modified", 0.0)
+        self.matches = OrderedDict()
+        self.lock = threading.Lock()
+
+    def where(self, expression):
+        """Positions of the rows matching ``expression``, narrowed one clause at a time.
+
+        Positions are cached by clause prefix, so keyset pages that add tree_id
+        bounds to a neighbourhood filter only scan that neighbourhood's rows.
+        """
+        positions = np.arange(len(self.df))
+        prefix = ""
+        for clause in re.split(r"\s+and\s+", expression, flags=re.IGNORECASE) if expression else []:
+            prefix = f"{prefix} and {clause}" if prefix else clause
+            with self.lock:
+                cached = self.matches.get(prefix)
+                if cached is not None:
+                    self.matches.move_to_end(prefix)
+            if cached is not None:
+                positions = cached
+                continue
+            match = CLAUSE.match(clause) or NULL_CLAUSE.match(clause)
+            if match is None or match.group(1) not in self.df:
+                raise BadRequest(f"Unsupported where clause: {clause}")
+            column = self.df[match.group(1)].iloc[positions]
+            if match.re is NULL_CLAUSE:
+                mask = column.notna() if match.group(2) else column.isna()
+            else:
+                _, operator, literal = match.groups()
+                value = literal[1:-1].replace("''", "'") if literal.startswith("'") else float(literal)
+                mask = OPERATORS[operator](column, value).fillna(False)
+            positions = positions[mask.to_numpy(dtype=bool)]
+            with self.lock:
+                self.matches[prefix] = positions
+                if len(self.matches) > MATCH_CACHE_SIZE:
+                    self.matches.popitem(last=False)
+        return positions
+
+    def order(self, positions, expression):
+        """``positions`` sorted by an ``order_by`` of one field, optionally followed by asc or desc."""
+        if not expression:
+            return positions
+        field, ascending = parse_order(expression, self.df.columns)
+        values = self.df[field].iloc[positions].reset_index(drop=True)
+        return positions[values.sort_values(ascending=ascending, kind="stable").index.to_numpy()]
+
+    def aggregate(self, positions, select, group_by, order_by):
+        """One result per ``group_by`` value (or one overall) of the aggregates and group field in ``select``."""
+        if group_by and group_by not in self.df:
+            raise BadRequest(f"Unknown group_by field: {group_by}")
+        outputs = []
+        for expression in (part.strip() for part in select.split(",")):
+            match = AGGREGATE.match(expression)
+            field, _, alias = expression.partition(" as ")
+            if match is not None:
+                function, field, alias = match.groups()
+                if field != "*" and field not in self.df:
+                    raise BadRequest(f"Unknown field in select: {field}")
+                outputs.append((alias or expression, function.lower(), field))
+            elif field.strip() == group_by:
+                outputs.append(((alias or field).strip(), None, group_by))
+            else:
+                raise BadRequest(f"{expression} must be an aggregate or the group_by field")
+        rows = self.df.iloc[positions]
+        groups = rows.groupby(group_by, dropna=False, sort=True, observed=True) if group_by else [(None, rows)]
+        results = []
+        for key, group in groups:
+            result = {}
+            for alias, function, field in outputs:
+                if function is None:
+                    result[alias] = key
+                elif field == "*":
+                    result[alias] = len(group)
+                else:
+                    result[alias] = AGGREGATES[function](group[field])
+            results.append(result)
+        results = pd.DataFrame(results, columns=[alias for alias, _, _ in outputs])
+        if order_by:
+            field, ascending = parse_order(order_by, results.columns)
+            results = results.sort_values(field, ascending=ascending, kind="stable")
+        return json.loads(results.to_json(orient="records", double_precision=15))  # NaN -> null
+
+    def select(self, expression):
+        """The field list of a ``select`` parameter; None selects every field."""
+        if not expression:
+            return None
+        fields = [field.strip() for field in expression.split(",")]
+        unknown = [field for field in fields if field not in self.df]
+        if unknown:
+            raise BadRequest(f"Unknown field in select: {', '.join(unknown)}")
+        return fields
+
+    def dataset(self):
+        modified = datetime.fromtimestamp(self.modified, timezone.utc).isoformat()
+        return {"dataset_id": "public-trees",
+                "metas": {"default": {"modified": modified, "data_processed": modified,
+                                      "records_count": len(self.df)}}}
+
+    def records(self, query):
+        limit = int(query.get("limit", 10))
+        offset = int(query.get("offset", 0))
+        if not 0 <= limit <= PAGE_SIZE:
+            raise BadRequest(f"limit must be between 0 and {PAGE_SIZE}")
+        if offset < 0 or offset + limit > MAX_OFFSET:
+            raise BadRequest(f"offset + limit must not exceed {MAX_OFFSET}")
+        positions = self.where(query.get("where"))
+        select = query.get("select", "")
+        if query.get("group_by") or any(AGGREGATE.match(part.strip()) for part in select.split(",")):
+            groups = self.aggregate(positions, select or "count(*)", query.get("group_by"), query.get("order_by"))
+            return {"total_count": len(groups), "results": groups[offset:offset + limit]}
+        positions = self.order(positions, query.get("order_by"))
+        fields = self.select(query.get("select"))
+        rows = self.df.iloc[positions[offset:offset + limit]]
+        return {"total_count": len(positions), "results": to_records(rows, fields)}
+
+    def export(self, export_format, query):
+        """Yield the whole matching set as text, EXPORT_CHUNK_ROWS records at a time."""
+        if export_format not in ("csv", "jsonl"):
+            raise BadRequest(f"Unsupported export format: {export_format}")
+        positions = self.order(self.where(query.get("where")), query.get("order_by"))
+        fields = self.select(query.get("select"))
+        limit = int(query.get("limit", -1))
+        if limit >= 0:
+            positions = positions[:limit]
+        if export_format == "csv":
+            columns = fields or list(self.df.columns)
+            delimiter = query.get("delimiter", CSV_SEP)
+            use_labels = query.get("use_labels", "false").lower() == "true"
+            header = self.df[columns].iloc[:0]
+            yield (header.rename(columns=self.labels) if use_labels else header).to_csv(sep=delimiter, index=False)
+        for start in range(0, len(positions), EXPORT_CHUNK_ROWS):
+            chunk = self.df.iloc[positions[start:start + EXPORT_CHUNK_ROWS]]
+            if export_format == "csv":
+                chunk = chunk[columns]
+                yield chunk.to_csv(sep=delimiter, index=False, header=False)
+            else:
+                yield "".join(json.dumps(record) + "\n" for record in to_records(chunk, fields))
+
+
+def make_handler(api, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, seed=None):
+    """A request handler serving ``api``.
+
+    Every response is delayed by ``latency`` plus up to ``jitter`` seconds, and
+    a ``error_rate`` fraction of requests fail with ``error_status`` instead.
+    """
+    rng = random.Random(seed)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; don't let Nagle hold the body back on keep-alive
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if latency or jitter:
+                time.sleep(latency + rng.uniform(0, jitter))
+            if error_rate and rng.random() < error_rate:
+                self.send_json(error_status, {"error_code": "InjectedError", "message": "Injected failure"})
+                return
+            url = urlsplit(self.path)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                if url.path == DATASET_PATH:
+                    self.send_json(200, api.dataset(), last_modified=api.modified)
+                elif url.path == RECORDS_PATH:
+                    self.send_json(200, api.records(query))
+                elif url.path.startswith(EXPORTS_PATH + "/"):
+                    export_format = url.path[len(EXPORTS_PATH) + 1:]
+                    chunks = api.export(export_format, query)
+                    first = next(chunks, "")  # raises BadRequest before any headers are sent
+                    content_type = "text/csv" if export_format == "csv" else "application/jsonl"
+                    self.send_stream(content_type, first, chunks)
+                else:
+                    self.send_json(404, {"error_code": "NotFound", "message": url.path})
+            except (BadRequest, ValueError) as e:
+                self.send_json(400, {"error_code": "InvalidRESTParameterError", "message": str(e)})
+
+        def send_json(self, status, payload, last_modified=None):
+            """Send ``payload`` with an ETag, or 304 when the request's validators still match."""
+            body = json.dumps(payload).encode()
+            etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+            if status == 200 and self.not_modified(etag, last_modified):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(status)
+            self.send_header("ETag", etag)
+            if last_modified is not None:
+                self.send_header("Last-Modified", formatdate(last_modified, usegmt=True))
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body, compresslevel=6)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def not_modified(self, etag, last_modified):
+            if "If-None-Match" in self.headers:
+                return etag in self.headers["If-None-Match"]
+            if "If-Modified-Since" in self.headers and last_modified is not None:
+                try:
+                    return int(last_modified) <= parsedate_to_datetime(self.headers["If-Modified-Since"]).timestamp()
+                except (TypeError, ValueError):
+                    return False
+            return False
+
+        def send_stream(self, content_type, first, chunks):
+            """Send text pieces as they are produced, with chunked transfer encoding."""
+            self.send_response(200)
+            self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+            self.send_header("Transfer-Encoding", "chunked")
+            compressor = None
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+                self.send_header("Content-Encoding", "gzip")
+            self.end_headers()
+            for text in chain([first], chunks):
+                data = text.encode()
+                self.write_chunk(compressor.compress(data) if compressor else data)
+            if compressor:
+                self.write_chunk(compressor.flush())
+            self.wfile.write(b"0\r\n\r\n")
+
+        def write_chunk(self, data):
+            if data:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def make_server(host="127.0.0.1", port=8765, latency=0.0, csv_path=CSV_PATH, **faults):
+    """A server for the records in ``csv_path``; ``faults`` are passed on to make_handler."""
+    return ThreadingHTTPServer((host, port), make_handler(TreeApi(load_records(csv_path)), latency, **faults))
+
+
+def start_server(**kwargs):
+    """Serve in a daemon thread; returns the server and its base URL (port 0 picks a free port)."""
+    server = make_server(**{"port": 0, **kwargs})
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
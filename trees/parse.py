@@ -0,0 +1,175 @@
+"""The canonical tree frame, and the conversions that produce it from each raw format.
+
+Every source adapter (see trees.sources) returns a frame with exactly COLUMNS,
+in these dtypes. Sources convert straight from their own format with the
+helpers here; nothing downstream inspects which columns happen to exist.
+"""
+import threading
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+from trees.schema import parse_date_planted, parse_geo_point
+
+# The one schema every source is parsed into; the dashboard reads these columns directly
+COLUMNS = {
+    'tree_id': 'int64',
+    'common_name': 'category',
+    'species_name': 'category',
+    'height_range': 'category',
+    'diameter': 'float32',
+    'plant_date': 'datetime64[s]',
+    'plant_year': 'float32',
+    'latitude': 'float64',
+    'longitude': 'float64',
+}
+
+# API record fields decoded to category codes as records arrive
+RECORD_CATEGORIES = ['common_name', 'species_name', 'height_range']
+# The buffers RecordColumns decodes records into; date_planted stays text until the frame is built
+RECORD_BUFFERS = {'tree_id': 'int64', 'diameter': 'float64', 'latitude': 'float64', 'longitude': 'float64',
+                  'date_planted': 'object'}
+
+
+def fill_unknown(series):
+    # Categorical columns (typed CSV, Parquet store) need 'Unknown' registered before filling
+    if (isinstance(series.dtype, pd.CategoricalDtype) and 'Unknown' not in series.cat.categories
+            and series.isna().any()):
+        series = series.cat.add_categories('Unknown')
+    return series.fillna('Unknown')
+
+
+def canonical_frame(tree_id, common_name=None, species_name=None, height_range=None, diameter=None,
+                    plant_date=None, latitude=None, longitude=None):
+    """Assemble COLUMNS from already-parsed Series; None stands for a field the source lacks."""
+    index = tree_id.index
+    missing = pd.Series(np.nan, index=index)
+    plant_date = plant_date if plant_date is not None else missing.astype('datetime64[s]')
+    return pd.DataFrame({
+        'tree_id': tree_id,
+        'common_name': fill_unknown(common_name) if common_name is not None else 'Unknown',
+        'species_name': fill_unknown(species_name) if species_name is not None else 'Unknown',
+        'height_range': fill_unknown(height_range) if height_range is not None else 'Unknown',
+        'diameter': pd.to_numeric(diameter, errors='coerce') if diameter is not None else missing,
+        'plant_date': plant_date,
+        'plant_year': plant_date.dt.year,
+        'latitude': latitude if latitude is not None else missing,
+        'longitude': longitude if longitude is not None else missing,
+    }, index=index).astype(COLUMNS)
+
+
+def empty_frame():
+    return canonical_frame(pd.Series([], dtype='int64'))
+
+
+def located(df):
+    """Drop trees without a location; returns ``df`` itself when every tree has one."""
+    mask = df['latitude'].notna() & df['longitude'].notna()
+    return df if mask.all() else df[mask]
+
+
+def from_csv(df):
+    """Convert rows of the CSV (typed or untyped read) into COLUMNS."""
+    latitude, longitude = parse_geo_point(df['geo_point_2d'])
+    return canonical_frame(
+        df['TREE_ID'], df['COMMON_NAME'], df['SPECIES_NAME'], df['HEIGHT_RANGE'], df['DIAMETER'],
+        parse_date_planted(df['DATE_PLANTED']), latitude, longitude)
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def record_point(record):
+    """``(latitude, longitude)`` of an API record, from geo_point_2d or else its GeoJSON geom.
+
+    Anything that isn't a pair of numbers gives NaN for both, as in the CSV path.
+    """
+    point = record.get('geo_point_2d')
+    if isinstance(point, dict) and is_number(point.get('lat')) and is_number(point.get('lon')):
+        return point['lat'], point['lon']
+    geom = record.get('geom')
+    geometry = geom.get('geometry') if isinstance(geom, dict) else None
+    coordinates = geometry.get('coordinates') if isinstance(geometry, dict) else None
+    if isinstance(coordinates, list) and len(coordinates) == 2 and all(map(is_number, coordinates)):
+        return coordinates[1], coordinates[0]
+    return np.nan, np.nan
+
+
+class RecordColumns:
+    """Typed column buffers that API records are decoded into as each page arrives.
+
+    The buffers are preallocated for the expected record count (and grow if more
+    arrive), so no more than a page of record dicts is alive alongside them.
+    ``extra`` names further record fields kept as categorical columns after
+    COLUMNS. Pages may be added from several threads in any order; ``frame``
+    returns the records in tree_id order.
+    """
+
+    def __init__(self, capacity=0, extra=()):
+        self.size = 0
+        self.lock = threading.Lock()
+        self.categorical = RECORD_CATEGORIES + list(extra)
+        # value -> code, per categorical field, in order of first appearance
+        self.categories = {field: {} for field in self.categorical}
+        self.buffers = {name: np.empty(0, dtype) for name, dtype in RECORD_BUFFERS.items()}
+        self.buffers.update((field, np.empty(0, 'int32')) for field in self.categorical)
+        self.reserve(capacity)
+
+    def reserve(self, capacity):
+        for name, buffer in self.buffers.items():
+            if len(buffer) < capacity:
+                grown = np.empty(capacity, buffer.dtype)
+                grown[:self.size] = buffer[:self.size]
+                self.buffers[name] = grown
+
+    def add(self, records):
+        # One pass over the page per column, written as a slice; None becomes NaN in the float buffers.
+        # Every record of a page has the same fields, so the first one tells which are there.
+        fields = records[0] if records else {}
+
+        def values(field):
+            return list(map(itemgetter(field), records)) if field in fields else [None] * len(records)
+
+        points = list(map(record_point, records))
+        with self.lock:
+            start, end = self.size, self.size + len(records)
+            if end > len(self.buffers['tree_id']):
+                self.reserve(max(end, 2 * self.size))
+            buffers = self.buffers
+            buffers['tree_id'][start:end] = values('tree_id')
+            buffers['diameter'][start:end] = values('diameter')
+            buffers['date_planted'][start:end] = values('date_planted')
+            buffers['latitude'][start:end] = [point[0] for point in points]
+            buffers['longitude'][start:end] = [point[1] for point in points]
+            for record_field in self.categorical:
+                codes = self.categories[record_field]
+                buffers[record_field][start:end] = [-1 if value is None else codes.setdefault(value, len(codes))
+                                                    for value in values(record_field)]
+            self.size = end
+
+    def categorical_column(self, record_field, order, missing=None):
+        # Categories sorted, and ``missing`` standing in for absent values, as canonical_frame leaves a text column
+        seen = self.categories[record_field]
+        codes = self.buffers[record_field][:self.size][order]
+        categories = sorted({*seen, missing} if missing is not None and (codes < 0).any() else seen)
+        code = {value: i for i, value in enumerate(categories)}
+        remap = np.array([code[value] for value in seen] + [code.get(missing, -1)], dtype='int32')
+        return pd.Series(pd.Categorical.from_codes(remap[codes], categories=categories))
+
+    def frame(self):
+        """The records added so far as COLUMNS (then the ``extra`` columns), in tree_id order."""
+        with self.lock:
+            order = np.argsort(self.buffers['tree_id'][:self.size], kind='stable')
+
+            def column(name):
+                return pd.Series(self.buffers[name][:self.size][order])
+
+            categorical = [self.categorical_column(field, order, 'Unknown') for field in RECORD_CATEGORIES]
+            df = canonical_frame(
+                column('tree_id'), *categorical, column('diameter'), parse_date_planted(column('date_planted')),
+                column('latitude'), column('longitude'))
+            for record_field in self.categorical[len(RECORD_CATEGORIES):]:
+                df[record_field] = self.categorical_column(record_field, order)
+            return df
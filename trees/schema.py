@@ -0,0 +1,74 @@
+"""Typed schema and field parsers for the public trees data."""
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pandas.api.types import union_categoricals
+
+CSV_SEP = ";"
+CHUNK_ROWS = 50_000
+
+# Only the columns the dashboard uses; Geom, CULTIVAR_NAME, STD_STREET etc. are never parsed
+CSV_DTYPES = {
+    "TREE_ID": "int32",
+    "COMMON_NAME": "category",
+    "SPECIES_NAME": "category",
+    "NEIGHBOURHOOD_NAME": "category",
+    "HEIGHT_RANGE_ID": "int8",
+    "HEIGHT_RANGE": "category",
+    "DIAMETER": "float32",
+    "DATE_PLANTED": "str",
+    "geo_point_2d": "str",
+}
+CSV_COLUMNS = list(CSV_DTYPES)
+
+
+def read_trees_csv(path, columns=CSV_COLUMNS, **kwargs):
+    dtypes = {column: CSV_DTYPES[column] for column in columns}
+    return pd.read_csv(path, sep=CSV_SEP, usecols=columns, dtype=dtypes, **kwargs)
+
+
+def parse_geo_point(series):
+    """Split "lat, lon" strings into two float Series, NaN where missing or malformed."""
+    try:
+        # Fixed format: one split and two casts, all inside Arrow kernels
+        parts = pc.split_pattern(pa.array(series, type=pa.string(), from_pandas=True), ",", max_splits=1)
+        latitude, longitude = (pc.cast(pc.utf8_trim_whitespace(pc.list_element(parts, i)), pa.float64())
+                               for i in (0, 1))
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Some value isn't "lat, lon"; coerce row by row instead
+        coords = series.str.split(",", expand=True).reindex(columns=[0, 1])
+        return pd.to_numeric(coords[0], errors="coerce"), pd.to_numeric(coords[1], errors="coerce")
+    return (pd.Series(latitude.to_numpy(zero_copy_only=False), index=series.index),
+            pd.Series(longitude.to_numpy(zero_copy_only=False), index=series.index))
+
+
+def parse_date_planted(series):
+    """Parse YYYY-MM-DD strings to datetimes, NaT where missing or malformed."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    dates = pc.strptime(pa.array(series, type=pa.string(), from_pandas=True),
+                        format="%Y-%m-%d", unit="s", error_is_null=True)
+    return pd.Series(dates.to_numpy(zero_copy_only=False), index=series.index)
+
+
+def iter_trees_csv(path, neighbourhood=None, columns=CSV_COLUMNS, chunksize=CHUNK_ROWS):
+    """Yield the CSV ``chunksize`` rows at a time, keeping only ``neighbourhood`` and ``columns``."""
+    read_columns = list(columns)
+    if neighbourhood is not None and "NEIGHBOURHOOD_NAME" not in read_columns:
+        read_columns.append("NEIGHBOURHOOD_NAME")
+    with read_trees_csv(path, columns=read_columns, chunksize=chunksize) as reader:
+        for chunk in reader:
+            if neighbourhood is not None:
+                chunk = chunk[chunk["NEIGHBOURHOOD_NAME"].str.upper() == neighbourhood.upper()]
+            yield chunk[list(columns)]
+
+
+def stream_trees_csv(path, neighbourhood=None, columns=CSV_COLUMNS, chunksize=CHUNK_ROWS):
+    """Read the matching rows with peak memory bounded by the chunk size, not the file size."""
+    chunks = list(iter_trees_csv(path, neighbourhood, columns, chunksize))
+    if not chunks:
+        return read_trees_csv(path, columns=list(columns), nrows=0)
+    # Every chunk infers its own categories; unify them so concat keeps the columns categorical
+    dtypes = {column: pd.CategoricalDtype(union_categoricals([chunk[column] for chunk in chunks]).categories)
+              for column in chunks[0].select_dtypes("category")}
+    return pd.concat([chunk.astype(dtypes) for chunk in chunks], ignore_index=True)
@@ -0,0 +1,238 @@
+"""Source adapters: each one loads a neighbourhood straight into trees.parse.COLUMNS.
+
+A new source only needs a TreeSource subclass whose ``load`` converts its own
+format with trees.parse.canonical_frame; nothing else has to change.
+"""
+import logging
+import os
+import threading
+import time
+
+from trees.api import API_TTL, SELECT_FIELDS, ApiClient, fetch_api_data, fetch_data_version, fetch_export, fetch_summary
+from trees.api_cache import PageCheckpoint
+from trees.arrays import open_column_store
+from trees.csv_index import open_indexed_csv
+from trees.dataset import CSV_PATH, file_signature, get_dataset
+from trees.parse import empty_frame, from_csv, located
+from trees.schema import stream_trees_csv
+from trees.store import STORE_PATH, is_fresh, read_partition
+from trees.summary import load_summary
+
+logger = logging.getLogger(__name__)
+
+# CSVs at least this large are streamed per neighbourhood instead of held in memory whole
+STREAM_MIN_BYTES = 256 * 1024 * 1024
+
+
+class TreeSource:
+    def available(self):
+        return True
+
+    def version(self):
+        """A value that changes whenever ``load`` may return different data."""
+        return None
+
+    def load(self, neighbourhood):
+        raise NotImplementedError
+
+    def summary(self, neighbourhood):
+        """The trees.summary.summarize dict of a neighbourhood, if available without loading it; else None."""
+        return None
+
+    def refreshing(self, neighbourhood):
+        """Whether newer data than ``load`` returns is downloading in the background."""
+        return False
+
+
+class ColumnStoreSource(TreeSource):
+    """Memory-mapped columns: every session shares the same pages, zero-copy."""
+
+    def available(self):
+        return open_column_store() is not None
+
+    def load(self, neighbourhood):
+        return located(open_column_store().neighbourhood(neighbourhood))
+
+
+class ParquetSource(TreeSource):
+    """The Parquet build of the CSV; reads only this neighbourhood's file."""
+
+    def available(self):
+        return is_fresh(STORE_PATH)
+
+    def load(self, neighbourhood):
+        return located(read_partition(neighbourhood))
+
+
+class IndexedCsvSource(TreeSource):
+    """The CSV with a byte-range index: parses only this neighbourhood's rows."""
+
+    def available(self):
+        return open_indexed_csv() is not None
+
+    def load(self, neighbourhood):
+        return located(from_csv(open_indexed_csv().neighbourhood(neighbourhood)))
+
+
+class CsvSource(TreeSource):
+    """The CSV itself, parsed once per process, or streamed in chunks when it is very large."""
+
+    def __init__(self, path=CSV_PATH, stream_min_bytes=STREAM_MIN_BYTES):
+        self.path = path
+        self.stream_min_bytes = stream_min_bytes
+
+    def available(self):
+        return os.path.exists(self.path)
+
+    def load(self, neighbourhood):
+        if os.path.getsize(self.path) >= self.stream_min_bytes:
+            df = stream_trees_csv(self.path, neighbourhood)
+        else:
+            df = get_dataset(self.path).neighbourhood(neighbourhood)
+        return located(from_csv(df))
+
+
+class LocalSource(TreeSource):
+    """The fastest available build of the local CSV."""
+
+    def __init__(self, sources=None):
+        self.sources = sources or [ColumnStoreSource(), ParquetSource(), IndexedCsvSource(), CsvSource()]
+
+    def available(self):
+        return any(source.available() for source in self.sources)
+
+    def version(self):
+        # Every local build is only used while it matches the CSV, so the CSV identifies the data
+        return file_signature(CSV_PATH) if os.path.exists(CSV_PATH) else None
+
+    def load(self, neighbourhood):
+        for source in self.sources:
+            if source.available():
+                return source.load(neighbourhood)
+        raise FileNotFoundError(f"No local tree data: {CSV_PATH} is missing and nothing was built from it")
+
+    def summary(self, neighbourhood):
+        # Precomputed by `python -m trees build`
+        return load_summary(neighbourhood)
+
+
+class PartialLoad(Exception):
+    """A download failed part way; ``frame`` holds the trees that did arrive, which mustn't be cached."""
+
+    def __init__(self, message, frame):
+        super().__init__(message)
+        self.frame = frame
+
+
+class ApiSource(TreeSource):
+    """Live records from the City of Vancouver API.
+
+    With a trees.api_cache.FrameCache, a neighbourhood already downloaded at the
+    dataset's current version is read from disk after one metadata request, and
+    with a ``checkpoint_path`` too, a download that failed part way resumes from
+    the pages it saved there (trees.api_cache.PageCheckpoint). ``load`` raises
+    PartialLoad rather than return an incomplete download.
+
+    Once the dataset has changed, ``load`` serves the last copy on disk straight
+    away (stale-while-revalidate) and downloads the new one in a background
+    thread. That swaps it into the FrameCache when complete and changes
+    ``version``, so the next load picks it up; a failed refresh is logged, and
+    ``version`` changes again once trees.api_cache.REFRESH_BACKOFF seconds have
+    passed, so the next load retries it. ``refreshing`` says whether one is
+    underway. Frames served carry ``attrs["fetched_at"]``.
+    """
+
+    def __init__(self, on_error=None, client=None, frames=None, checkpoint_path=None):
+        self.on_error = on_error
+        self.client = client or ApiClient()
+        self.frames = frames
+        self.checkpoint_path = checkpoint_path
+
+    def version(self):
+        # Changes too when a background refresh has swapped in new data, or a failed one is due a retry
+        return int(time.time() // API_TTL), self.frames.changes() if self.frames is not None else None
+
+    def load(self, neighbourhood):
+        if self.frames is None:
+            return self.download(neighbourhood, None, self.on_error)
+        try:
+            data_version = fetch_data_version(self.client)
+        except Exception:
+            data_version = None  # can't tell whether the cached copy is current
+        if data_version is not None:
+            df = self.frames.get(neighbourhood, data_version)
+            if df is not None:
+                return df
+        df = self.frames.latest(neighbourhood)
+        if df is None:
+            return self.download(neighbourhood, data_version, self.on_error)
+        if data_version is not None:
+            self.refresh(neighbourhood, data_version)
+        return df
+
+    def download(self, neighbourhood, data_version, on_error=None):
+        """Fetch a neighbourhood, caching it as ``data_version`` if that is known; raises PartialLoad."""
+        errors = []
+
+        def report(message):
+            errors.append(message)
+            if on_error is not None:
+                on_error(message)
+
+        checkpoint = None
+        if data_version is not None and self.checkpoint_path is not None:
+            checkpoint = PageCheckpoint([neighbourhood, data_version, SELECT_FIELDS], self.checkpoint_path)
+        df = self.fetch(neighbourhood, report, checkpoint)
+        if errors:
+            raise PartialLoad("; ".join(errors), df)
+        df.attrs["fetched_at"] = time.time()
+        if data_version is not None:
+            self.frames.put(neighbourhood, data_version, df)
+        return df
+
+    def refresh(self, neighbourhood, data_version):
+        """Download a neighbourhood in a background thread unless another source sharing the FrameCache
+        already is, or one failed recently."""
+        if self.frames.claim_refresh(neighbourhood):
+            threading.Thread(target=self.run_refresh, args=(neighbourhood, data_version), daemon=True).start()
+
+    def refreshing(self, neighbourhood):
+        return self.frames is not None and self.frames.is_refreshing(neighbourhood)
+
+    def run_refresh(self, neighbourhood, data_version):
+        try:
+            self.download(neighbourhood, data_version)
+        except Exception:
+            logger.warning("Refreshing %s failed; serving the cached copy", neighbourhood or "the whole city",
+                           exc_info=True)
+            self.frames.finish_refresh(neighbourhood, succeeded=False)
+        else:
+            self.frames.finish_refresh(neighbourhood, succeeded=True)
+
+    def fetch(self, neighbourhood, on_error, checkpoint=None):
+        return located(fetch_api_data(neighbourhood, on_error, self.client, checkpoint=checkpoint))
+
+    def summary(self, neighbourhood):
+        # Aggregated by the API: a few requests instead of every record. A failed request raises rather
+        # than returning None, so the app's st.cache_data doesn't keep the failure for the whole version
+        if self.frames is not None:
+            # While load serves an older copy, the statistics must describe that copy, not the live data
+            cached = self.frames.data_version(neighbourhood)
+            if cached is not None and cached != str(fetch_data_version(self.client)):
+                return None
+        return fetch_summary(neighbourhood, self.client)
+
+
+class ExportSource(ApiSource):
+    """Live records from the API's exports endpoint: one streamed download instead of paged requests."""
+
+    def __init__(self, export_format="csv", on_error=None, client=None, frames=None):
+        super().__init__(on_error, client, frames)
+        self.export_format = export_format
+
+    def fetch(self, neighbourhood, on_error, checkpoint=None):
+        # One streamed response has no pages to checkpoint
+        df = fetch_export(neighbourhood, self.export_format, on_error, self.client)
+        if df.empty:
+            return empty_frame()
+        return located(from_csv(df) if self.export_format == "csv" else df)
@@ -0,0 +1,76 @@
+"""Columnar Parquet build of the public trees CSV, one file per neighbourhood.
+
+Built by ``python -m trees build``. Readers fall back to the CSV when the
+store is missing or was built from a different version of the CSV.
+"""
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from trees.dataset import CSV_PATH, file_signature
+from trees.parse import COLUMNS, empty_frame
+
+STORE_PATH = "data/public-trees.parquet"
+MANIFEST = "_manifest.json"
+# Bumped whenever the stored layout changes; builds of another format count as stale
+STORE_FORMAT = 2
+
+
+def partition_file(neighbourhood, store_path=STORE_PATH):
+    return os.path.join(store_path, f"{neighbourhood.upper()}.parquet")
+
+
+def scratch_dir(path):
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    return tmp_path
+
+
+def swap_in(tmp_path, path):
+    # Readers only ever see a complete build: the old one until the rename, then the new one
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+
+
+def build_store(dataset, store_path=STORE_PATH):
+    """Write a TreeDataset of trees.parse.COLUMNS frames as one file per neighbourhood."""
+    tmp_path = scratch_dir(store_path)
+    for name in dataset.neighbourhoods:
+        dataset.neighbourhood(name).to_parquet(partition_file(name, tmp_path), index=False)
+    with open(os.path.join(tmp_path, MANIFEST), "w") as f:
+        json.dump({**dataset.source_info(), "format": STORE_FORMAT, "neighbourhoods": dataset.neighbourhoods},
+                  f, indent=2)
+    swap_in(tmp_path, store_path)
+    return store_path
+
+
+def read_manifest(store_path=STORE_PATH):
+    try:
+        with open(os.path.join(store_path, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(store_path=STORE_PATH, csv_path=CSV_PATH):
+    manifest = read_manifest(store_path)
+    if manifest is None or manifest.get("format") != STORE_FORMAT:
+        return False
+    if not os.path.exists(csv_path):
+        # Deployments may ship the store without the CSV it was built from
+        return True
+    return (manifest["mtime_ns"], manifest["size"]) == file_signature(csv_path)
+
+
+def read_partition(neighbourhood, store_path=STORE_PATH, csv_path=CSV_PATH):
+    """Read one neighbourhood from the store, or return None if the store can't be used."""
+    if not is_fresh(store_path, csv_path):
+        return None
+    path = partition_file(neighbourhood, store_path)
+    if not os.path.exists(path):
+        return empty_frame()
+    # Parquet has no second-resolution timestamps, so plant_date comes back wider
+    return pd.read_parquet(path, columns=list(COLUMNS)).astype(COLUMNS)
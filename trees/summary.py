@@ -0,0 +1,107 @@
+"""Filter options, ranges and statistics for parsed neighbourhood frames.
+
+``python -m trees build`` precomputes these for every neighbourhood into a
+JSON sidecar so the dashboard doesn't derive them on each run.
+"""
+import json
+import os
+import threading
+
+import pandas as pd
+
+from trees.dataset import CSV_PATH, file_signature
+from trees.parse import located
+from trees.store import STORE_FORMAT
+
+SUMMARY_PATH = "data/public-trees.summary.json"
+
+
+def number_or_none(value):
+    return float(value) if pd.notnull(value) else None
+
+
+def counts(series):
+    # Categorical columns also count categories that don't occur here, so drop zeros
+    values = series.value_counts().loc[lambda c: c > 0]
+    return [[name, int(count)] for name, count in values.items()]
+
+
+def summarize(df):
+    """Summarize a trees.parse.COLUMNS frame: what the sidebar offers and the unfiltered statistics."""
+    return {
+        "rows": len(df),
+        "common_names": sorted(df['common_name'].unique()),
+        "height_ranges": sorted(df['height_range'].unique()),
+        "diameter_range": [number_or_none(df['diameter'].min(skipna=True)),
+                           number_or_none(df['diameter'].max(skipna=True))],
+        "year_range": [number_or_none(df['plant_year'].min(skipna=True)),
+                       number_or_none(df['plant_year'].max(skipna=True))],
+        "avg_diameter": number_or_none(df['diameter'].mean()),
+        "top_types": counts(df['common_name'])[:10],
+        "height_distribution": counts(df['height_range']),
+    }
+
+
+def summary_from_aggregates(name_counts, height_counts, diameter_range, year_range, avg_diameter):
+    """The summarize() dict from counts and extremes computed elsewhere, e.g. by the API's group_by.
+
+    ``name_counts`` and ``height_counts`` are [value, count] pairs; None values
+    count as 'Unknown', as trees.parse fills them.
+    """
+    def merged(pairs):
+        totals = {}
+        for value, count in pairs:
+            value = 'Unknown' if value is None else value
+            totals[value] = totals.get(value, 0) + int(count)
+        return sorted(([value, count] for value, count in totals.items() if count > 0),
+                      key=lambda pair: (-pair[1], pair[0]))
+
+    names, heights = merged(name_counts), merged(height_counts)
+    return {
+        "rows": sum(count for _, count in names),
+        "common_names": sorted(name for name, _ in names),
+        "height_ranges": sorted(height for height, _ in heights),
+        "diameter_range": [number_or_none(value) for value in diameter_range],
+        "year_range": [number_or_none(value) for value in year_range],
+        "avg_diameter": number_or_none(avg_diameter),
+        "top_types": names[:10],
+        "height_distribution": heights,
+    }
+
+
+def build_summary(dataset, summary_path=SUMMARY_PATH):
+    """Write the summary of every neighbourhood of a TreeDataset of trees.parse.COLUMNS frames."""
+    summaries = {name: summarize(located(dataset.neighbourhood(name))) for name in dataset.neighbourhoods}
+    tmp_path = summary_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({**dataset.source_info(), "format": STORE_FORMAT, "neighbourhoods": summaries}, f, indent=2)
+    os.replace(tmp_path, summary_path)
+    return summary_path
+
+
+_summaries = {}
+_lock = threading.Lock()
+
+
+def load_summary(neighbourhood, summary_path=SUMMARY_PATH, csv_path=CSV_PATH):
+    """Return the precomputed summary, or None when the sidecar is missing, stale or unreadable."""
+    with _lock:
+        try:
+            signature = file_signature(summary_path)
+            cached = _summaries.get(summary_path)
+            if cached is None or cached[0] != signature:
+                with open(summary_path) as f:
+                    cached = (signature, json.load(f))
+                _summaries[summary_path] = cached
+        except (OSError, ValueError):
+            return None
+    summary = cached[1]
+    try:
+        if summary["format"] != STORE_FORMAT:
+            return None
+        if os.path.exists(csv_path) and (summary["mtime_ns"], summary["size"]) != file_signature(csv_path):
+            return None
+        return summary["neighbourhoods"].get(neighbourhood.upper())
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        # Half-written, hand-edited or older sidecars: the caller summarizes the loaded trees instead
+        return None
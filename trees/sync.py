@@ -0,0 +1,143 @@
+"""Incremental sync of the API's records into the on-disk frame cache (trees.api_cache.FrameCache).
+
+Run with ``python -m trees sync``. Afterwards every neighbourhood is cached at
+the dataset's current version, so API mode loads one with a single request.
+
+The public-trees records carry no per-record modification time, so a sync
+fetches only the trees above the last sync's highest tree_id. If the dataset's
+total count then doesn't add up, trees were removed or replaced, and the sync
+falls back to downloading everything. So it does if any neighbourhood's
+located trees don't match the merged frame in count, tree_id sum and diameter
+sum (one aggregate request), which catches a removal paired with an addition
+and in-place diameter edits. Edits to names, heights or planting dates alone
+still need ``--full``.
+"""
+import json
+import math
+import os
+
+import pandas as pd
+
+from trees.api import (PAGE_SIZE, RECORDS_PATH, SELECT_FIELDS, ApiClient, fetch_api_data, fetch_data_version,
+                       fetch_key_range, fetch_page)
+from trees.api_cache import CACHE_PATH, CHECKPOINT_PATH, FrameCache, PageCheckpoint, ResponseCache, write_atomic
+from trees.parse import COLUMNS, RecordColumns, empty_frame, located
+
+SYNC_STATE = os.path.join(CACHE_PATH, "sync.json")
+SYNC_FIELDS = SELECT_FIELDS + ["neighbourhood_name"]
+
+
+class SyncError(Exception):
+    pass
+
+
+def read_state(state_path=SYNC_STATE):
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def raise_error(message):
+    raise SyncError(message)
+
+
+def by_neighbourhood(records):
+    """Split SYNC_FIELDS records (COLUMNS plus neighbourhood_name) into canonical frames per upper-cased
+    neighbourhood."""
+    if records.empty:
+        return {}
+    names = records['neighbourhood_name'].map(str.upper, na_action='ignore')
+    neighbourhoods = {}
+    for name, rows in records[list(COLUMNS)].groupby(names, observed=True, sort=True):
+        neighbourhoods[name] = located(rows.reset_index(drop=True).apply(
+            lambda column: column.cat.remove_unused_categories() if column.dtype == 'category' else column))
+    return neighbourhoods
+
+
+def fetch_fingerprints(client):
+    """Per upper-cased neighbourhood, the count, tree_id sum and diameter sum of the trees with a location."""
+    select = "neighbourhood_name, count(*) as trees, sum(tree_id) as id_sum, sum(diameter) as diameter_sum"
+    groups = []
+    while True:
+        params = {"where": "geo_point_2d is not null", "group_by": "neighbourhood_name", "select": select,
+                  "limit": PAGE_SIZE, "offset": len(groups)}
+        page = client.get_json(RECORDS_PATH, params)['results']
+        groups.extend(page)
+        if len(page) < PAGE_SIZE:
+            return {group['neighbourhood_name'].upper():
+                    (group['trees'], group['id_sum'], group['diameter_sum'] or 0)
+                    for group in groups if group['neighbourhood_name']}
+
+
+def changed_neighbourhoods(fingerprints, neighbourhoods):
+    """The neighbourhoods whose frames don't match the API's fingerprints, in either direction."""
+    changed = []
+    for name in sorted(set(fingerprints) | set(neighbourhoods)):
+        frame = neighbourhoods.get(name, empty_frame())
+        trees, id_sum, diameter_sum = fingerprints.get(name, (0, 0, 0))
+        if (len(frame) != trees or int(frame['tree_id'].sum()) != id_sum
+                or not math.isclose(frame['diameter'].astype('float64').sum(), diameter_sum, abs_tol=0.01)):
+            changed.append(name)
+    return changed
+
+
+def merge(cached, new):
+    """``cached`` with ``new`` appended, the newer copy winning for a tree_id in both, in tree_id order."""
+    merged = pd.concat([cached, new], ignore_index=True).drop_duplicates('tree_id', keep='last')
+    return merged.sort_values('tree_id', ignore_index=True).astype(COLUMNS)
+
+
+def sync(client=None, frames=None, state_path=SYNC_STATE, full=False, log=print, checkpoint_path=CHECKPOINT_PATH):
+    """Bring ``frames`` up to the API's current data; returns the new sync state.
+
+    The state records the dataset version, the highest tree_id and the number of
+    records synced (including trees without a neighbourhood, which aren't cached).
+    A full download that fails part way resumes from its checkpoint under
+    ``checkpoint_path`` on the next run.
+    """
+    client = client or ApiClient(cache=ResponseCache())
+    frames = frames or FrameCache()
+    data_version = fetch_data_version(client)
+    state = None if full else read_state(state_path)
+    if state is not None and state["data_version"] == data_version:
+        log(f"Up to date with the dataset as of {data_version}")
+        return state
+
+    total = fetch_page(client, None, fields=['tree_id'], limit=1)['total_count']
+    neighbourhoods = None
+    if state is not None and all(frames.data_version(name) == state["data_version"]
+                                 for name in state["neighbourhoods"]):
+        new = RecordColumns(extra=["neighbourhood_name"])
+        fetch_key_range(client, None, state["high_water"], None, SYNC_FIELDS, new.add)
+        new = new.frame()
+        if state["records"] + len(new) == total:
+            log(f"Fetched {len(new)} trees added since the last sync")
+            neighbourhoods = {name: frames.get(name, state["data_version"]) for name in state["neighbourhoods"]}
+            for name, frame in by_neighbourhood(new).items():
+                neighbourhoods[name] = merge(neighbourhoods.get(name, empty_frame()), frame)
+            high_water = max([state["high_water"], *new.get('tree_id', [])])
+            changed = changed_neighbourhoods(fetch_fingerprints(client), neighbourhoods)
+            if changed:
+                log(f"Trees were removed, replaced or edited in {', '.join(changed)}: syncing everything")
+                neighbourhoods = None
+        else:
+            log(f"The dataset has {total} trees, not {state['records'] + len(new)}: "
+                f"trees were removed or replaced, syncing everything")
+
+    if neighbourhoods is None:
+        checkpoint = PageCheckpoint([None, data_version, SYNC_FIELDS], checkpoint_path)
+        records = fetch_api_data(None, on_error=raise_error, client=client, fields=SYNC_FIELDS, checkpoint=checkpoint)
+        log(f"Fetched all {len(records)} trees")
+        neighbourhoods = by_neighbourhood(records)
+        high_water = records['tree_id'].max() if len(records) else 0
+        total = len(records)
+
+    for name, frame in neighbourhoods.items():
+        frames.put(name, data_version, frame)
+    state = {"data_version": data_version, "high_water": int(high_water), "records": total,
+             "neighbourhoods": sorted(neighbourhoods)}
+    write_atomic(state_path, json.dumps(state, indent=2).encode())
+    log(f"Synced {len(neighbourhoods)} neighbourhoods to the dataset as of {data_version}")
+    return state